@@ -1,113 +1,266 @@
+import os
+import threading
+import time
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
 import shop
+import dashboard
+import offline
+import perf
+import store
+import sheets
+import fake_sheets
+import questdata
+from levels import calculate_progress
 
 # --- KONFIGURATION ---
 st.set_page_config(page_title="Questlog", page_icon="🛡️", layout="centered")
 st.title("🛡️ Questlog")
 
-# Level-Tabelle
-LEVEL_THRESHOLDS = {
-    1: 0, 2: 42, 3: 143, 4: 332, 5: 640, 6: 1096, 7: 1728, 8: 2567,
-    9: 3640, 10: 4976, 11: 6602, 12: 8545, 13: 10831, 14: 13486, 15: 16536, 16: 20003
-}
-
-def calculate_progress(current_xp):
-    current_level = 1
-    for lvl, threshold in LEVEL_THRESHOLDS.items():
-        if current_xp >= threshold:
-            current_level = lvl
-        else:
-            break
-    
-    if current_level >= 16:
-        return 1.0, "Maximales Level erreicht! 🏆"
-    
-    current_level_start = LEVEL_THRESHOLDS[current_level]
-    next_level_start = LEVEL_THRESHOLDS[current_level + 1]
-    
-    xp_gained = current_xp - current_level_start
-    xp_needed = next_level_start - current_level_start
-    
-    if xp_needed <= 0: return 1.0, "Level Up!"
-    
-    progress = max(0.0, min(1.0, xp_gained / xp_needed))
-    return progress, f"{int(xp_gained)} / {int(xp_needed)} XP zum nächsten Level"
-
-def clean_number(val):
-    """Macht aus allem sicher eine Zahl."""
-    if pd.isna(val) or str(val).strip() == "":
-        return 0
-    if isinstance(val, (int, float)):
-        return int(val)
-    s = str(val).strip()
-    if s.endswith(".0"): s = s[:-2]
-    s = s.replace('.', '').replace(',', '.')
-    try:
-        return int(float(s))
-    except:
-        return 0
-
-def is_checkbox_checked(val):
-    """Prüft auf Checkboxen (True, 1, WAHR, CHECKED)."""
-    if pd.isna(val): return False
-    if isinstance(val, bool): return val
-    if isinstance(val, (int, float)): return val >= 1
-    s = str(val).strip().upper()
-    return s in ["TRUE", "WAHR", "1", "CHECKED", "YES", "ON"]
-
 # --- VERBINDUNG ---
 spreadsheet_id = "1xfAbOwU6DrbHgZX5AexEl3pedV9vTxyTFbXrIU06O7Q"
 blatt_xp = "XP Rechner 3.0"
 blatt_quests = "Questbuch 4.0"
+CACHE_TTL = 60  # Sekunden, bis ein Blatt erneut aus Google Sheets geladen wird
+BACKGROUND_REFRESH = 0  # Sekunden zwischen Aktualisierungen im Hintergrund (0 = aus)
+OFFLINE_DIR = "data/offline"  # Letzter ausgewerteter Stand für Kaltstart/Ausfälle
+SHOP_DB = "data/shop.db"  # Gold + Inventar der Spieler (SQLite)
+SHOP_SHEET = "Shop Käufe"  # Blatt, in das Käufe gesammelt zurückgeschrieben werden
+SHOP_SYNC_INTERVAL = 10  # Sekunden zwischen zwei Schreibaufrufen (0 = aus)
+# Lokaler Betrieb ohne Google, z.B. QUESTLOG_FAKE_SHEETS="students=300,quests=40,latency=0.1"
+# (siehe fake_sheets.parse_spec; genutzt von loadtest.py)
+FAKE_SHEETS = os.environ.get("QUESTLOG_FAKE_SHEETS", "")
+# Zeitmessung jedes Reruns als JSON Lines in diese Datei (leer = nur im Debug-Modus messen)
+PERF_LOG = os.environ.get("QUESTLOG_PERF_LOG", "")
+if FAKE_SHEETS:
+    spreadsheet_id = "fake"
+    OFFLINE_DIR = "data/fake/offline"
+    SHOP_DB = "data/fake/shop.db"
+
+def build_indexes(snaps):
+    """Alle Indizes eines Snapshot-Paars; pro Snapshot nur einmal gebaut (auch im Hintergrund-Thread)."""
+    xp_snap, q_snap = snaps[blatt_xp], snaps[blatt_quests]
+    # Layout (Spalten/Zeilen) einmal pro Snapshot prüfen; SchemaError, bevor der Snapshot sichtbar wird.
+    # Offline-Snapshots bringen die Indizes schon mit, dort wird kein Layout gebraucht.
+    players = xp_snap.derive(
+        "players", lambda values: questdata.PlayerIndex(values, xp_snap.derive("layout", questdata.XpLayout))
+    )
+    names = q_snap.derive(
+        "names", lambda values: questdata.NameIndex(values, q_snap.derive("layout", questdata.QuestLayout))
+    )
+    quests = q_snap.derive(
+        "quests", lambda values: questdata.QuestMatrix(values, q_snap.derive("layout", questdata.QuestLayout))
+    )
+    summary = q_snap.derive(
+        ("summary", xp_snap.version),
+        lambda values: questdata.ClassSummary(players, names, quests)
+    )
+    return players, names, quests, summary
+
+def prepare_snapshots(snaps):
+    """prepare-Hook für neu geladene Snapshots: Indizes bauen, Offline-Stand im Hintergrund sichern."""
+    players, names, quests, _ = build_indexes(snaps)
+    # Alles Weitere aus dem Questbuch kommt aus den Indizes; die Rohwerte (größter Speicherposten) werden frei
+    snaps[blatt_quests].release_values()
+    threading.Thread(
+        target=offline.save_quietly,
+        args=(OFFLINE_DIR, spreadsheet_id, (blatt_xp, blatt_quests), snaps, players, names, quests),
+        daemon=True
+    ).start()
+
+@st.cache_resource
+def get_sheets_client():
+    # Auth + open_by_key nur einmal pro Prozess statt bei jedem Rerun
+    if FAKE_SHEETS:
+        return sheets.SheetsClient.for_spreadsheet(fake_sheets.shared(FAKE_SHEETS))
+    return sheets.SheetsClient(st.secrets["connections"]["gsheets"], spreadsheet_id)
+
+@st.cache_resource
+def get_batch_loader():
+    # Lädt beide Blätter in einem Aufruf; vom XP Rechner nur die benötigten Spalten
+    return sheets.BatchLoader(
+        column_spans={blatt_xp: questdata.xp_column_spans},
+        limiter=get_sheets_client().limiter
+    )
+
+@st.cache_resource
+def get_snapshot_cache():
+    # Ein Cache pro Prozess, geteilt von allen Sessions; Start mit dem Offline-Stand (falls vorhanden)
+    cache = sheets.SnapshotCache(ttl=CACHE_TTL)
+    stored = offline.load(OFFLINE_DIR, spreadsheet_id)
+    if stored:
+        cache.seed(spreadsheet_id, stored)
+    return cache
+
+@st.cache_resource
+def get_shop_store():
+    # Eine Datenbank pro Prozess; Käufe überleben Reloads und gelten für alle Sessions
+    return store.ShopStore(SHOP_DB)
+
+@st.cache_resource
+def get_purchase_sync():
+    # Schreibt Käufe im Hintergrund gesammelt ins Spreadsheet (ein Aufruf pro Intervall)
+    client = get_sheets_client()
+    return store.PurchaseSync(
+        get_shop_store(),
+        append=lambda rows: client.append_rows(SHOP_SHEET, rows, header=store.PURCHASE_HEADER),
+        existing_keys=lambda: client.column_values(SHOP_SHEET, 1),
+        interval=SHOP_SYNC_INTERVAL
+    ).start()
+
+@st.cache_resource
+def get_refresher():
+    # Hält die Snapshots im Hintergrund aktuell (ein Thread pro Prozess)
+    client = get_sheets_client()
+    loader = get_batch_loader()
+    return sheets.Refresher(
+        get_snapshot_cache(), spreadsheet_id, [blatt_xp, blatt_quests],
+        fetch=lambda titles: loader.fetch(client.spreadsheet(), titles),
+        revision=client.revision,
+        prepare=prepare_snapshots,
+        interval=BACKGROUND_REFRESH
+    ).start()
+
+# --- FRAGMENTE ---
+# Klicks innerhalb eines Fragments führen nur dieses erneut aus, nicht das ganze Skript
+# (kein Laden der Blätter, keine Schülersuche).
+
+@st.fragment
+def shop_tab(gamertag, debug_mode):
+    start = time.perf_counter()
+    with perf.span("shop"):
+        shop.show_shop(gamertag, get_shop_store())
+    if debug_mode:
+        st.caption(f"🔍 DEBUG - Shop-Fragment: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+QUEST_CARDS = {
+    # erledigt: (Rahmen, Hintergrund, Schrift, XP-Text)
+    False: ("#ccc", "#f5f5f5", "#333", "🔒 {xp} XP"),
+    True: ("#cfeadf", "#e8f9ef", "#0b6b3a", "✨ +{xp} XP"),
+}
+
+@st.fragment
+def quest_tab(title, quest_list, done, empty_msg):
+    st.subheader(title)
+    if not quest_list:
+        (st.info if done else st.success)(empty_msg)
+        return
+    border, background, color, xp_text = QUEST_CARDS[done]
+    cols = st.columns(3)
+    for idx, quest in enumerate(quest_list):
+        with cols[idx % 3]:
+            st.markdown(f"""
+            <div style="border:2px solid {border}; padding:20px; border-radius:10px; 
+                        background-color:{background}; color:{color}; margin-bottom:15px;">
+                <strong>{quest['name']}</strong><br>
+                {xp_text.format(xp=quest['xp'])}
+            </div>
+            """, unsafe_allow_html=True)
+
+def finish_trace():
+    """Zeitmessung des Reruns abschließen, loggen und im Debug-Modus als Wasserfall zeigen."""
+    trace = perf.finish(PERF_LOG or None)
+    if trace and st.session_state.get("debug_mode"):
+        with st.sidebar.expander(f"⏱️ Rerun: {trace.total_ms:.0f} ms", expanded=True):
+            st.dataframe(
+                pd.DataFrame(perf.waterfall(trace), columns=["Schritt", "Start ms", "ms", "Verlauf"]),
+                hide_index=True
+            )
+
+def stop():
+    # Nach st.stop() wird nichts mehr angezeigt -> Wasserfall vorher ausgeben
+    finish_trace()
+    st.stop()
+
+# Spans nur messen, wenn sie angezeigt oder geloggt werden (sonst No-op)
+perf.start(st.session_state.get("debug_mode", False) or bool(PERF_LOG))
+snapshots = get_snapshot_cache()
 
 with st.sidebar:
-    if st.button("🔄 Aktualisieren"):
-        st.cache_data.clear()
-        st.rerun()
+    # Erzwingt in diesem Rerun die Prüfung/das Nachladen; der alte Stand bleibt als Reserve im Cache
+    force_reload = st.button("🔄 Aktualisieren")
     st.caption("v31.0 - Tabs (Shop, Quests) + gspread")
-    debug_mode = st.checkbox("🔍 Debug-Modus", value=False)
+    refresh_info = st.empty()
+    ansicht = st.radio("Ansicht:", ["🛡️ Questlog", "🏆 Rangliste"])
+    debug_mode = st.checkbox("🔍 Debug-Modus", value=False, key="debug_mode")
 
 try:
-    # Authentifizierung mit Google Sheets via gspread
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    credentials = Credentials.from_service_account_info(
-        st.secrets["connections"]["gsheets"],
-        scopes=scopes
-    )
-    gc = gspread.authorize(credentials)
-    spreadsheet = gc.open_by_key(spreadsheet_id)
+    # Authentifizierung mit Google Sheets via gspread (Verbindung wird wiederverwendet,
+    # aufgebaut erst beim ersten Zugriff – mit Offline-Stand geht es auch ohne Verbindung)
+    sheets_client = get_sheets_client()
+    if debug_mode:
+        st.write(f"🔍 **DEBUG - Verbindung:** {sheets_client.stats()}")
+    if BACKGROUND_REFRESH:
+        refresher = get_refresher()
+        if refresher.last_refresh:
+            stand = time.strftime("%H:%M:%S", time.localtime(refresher.last_refresh))
+            fehler = " ⚠️" if refresher.last_error else ""
+            refresh_info.caption(f"Aktualisiert: {stand} ({refresher.last_duration:.1f} s){fehler}")
 
     # ----------------------------------------------------------------
     # 1. LOGIN & LEVEL (XP Rechner 3.0)
     # ----------------------------------------------------------------
     try:
-        raw_data = spreadsheet.worksheet(blatt_xp).get_all_values()
+        # Beide Blätter mit einem batchGet (nur wenn nicht im Cache)
+        batch_loader = get_batch_loader()
+        # Nach Ablauf der TTL nur neu laden, wenn sich das Spreadsheet geändert hat
+        with perf.span("snapshots"):
+            data = snapshots.get_many(
+                spreadsheet_id, [blatt_xp, blatt_quests],
+                lambda titles: batch_loader.fetch(sheets_client.spreadsheet(), titles),
+                revision=sheets_client.revision,
+                prepare=prepare_snapshots,
+                force=force_reload
+            )
+        raw_data = data[blatt_xp].values
+        stand = time.strftime("%d.%m.%Y %H:%M", time.localtime(data[blatt_xp].loaded_at))
+        if data[blatt_xp].stale_since:
+            if isinstance(snapshots.last_error, questdata.SchemaError):
+                st.warning(f"⚠️ Der Aufbau der Tabelle passt nicht ({snapshots.last_error}) – angezeigt wird der Stand vom {stand}")
+            else:
+                st.warning(f"⚠️ Keine aktuelle Verbindung zu Google Sheets – Stand: {stand}")
+        elif data[blatt_xp].offline:
+            # Kaltstart: Offline-Stand, bis der Hintergrund-Abgleich mit Google Sheets durch ist
+            st.caption(f"Stand: {stand}")
         if debug_mode:
+            st.write(f"🔍 **DEBUG - Cache:** {snapshots.stats}, Stand: {data[blatt_xp].revision}")
+            st.write(f"🔍 **DEBUG - API-Kontingent:** {sheets_client.limiter.stats}, frei: {sheets_client.limiter.remaining()}/min")
             st.write("🔍 **DEBUG - XP Rechner Rohdata (erste 5 Zeilen):**")
-            st.write(raw_data[:5])
-        df_xp = pd.DataFrame(raw_data[1:])
-        if len(df_xp) == 0:
+            st.write(raw_data[:5] if raw_data is not None else "(Offline-Stand, keine Rohdaten)")
+        if raw_data is not None and len(raw_data) <= 1:
             raise ValueError("Leeres Sheet")
+        # Indizes: einmal pro Snapshot aufgebaut, von allen Sessions geteilt
+        with perf.span("indexes"):
+            players, names, quests, summary = build_indexes(data)
     except Exception as e:
-        st.error(f"Fehler beim Laden von '{blatt_xp}': {e}")
+        if sheets.is_quota_error(e):
+            st.error("Google Sheets ist gerade überlastet. Bitte in einer Minute erneut versuchen.")
+        elif isinstance(e, questdata.SchemaError):
+            st.error(f"📋 Der Aufbau der Tabelle passt nicht: {e}")
+        else:
+            st.error(f"Fehler beim Laden von '{blatt_xp}': {e}")
         if debug_mode:
             st.write("Debug - Exception Details:")
             st.exception(e)
-        st.stop()
+        stop()
 
-    if debug_mode:
+    if debug_mode and raw_data is not None:
+        with perf.span("debug: DataFrame"):
+            df_xp = pd.DataFrame(raw_data[1:])
         st.write("🔍 **DEBUG - DataFrame Shape & Columns:**")
         st.write(f"Shape: {df_xp.shape}")
         st.write(f"Columns: {list(df_xp.columns)}")
         st.write("🔍 **DEBUG - Erste 5 Zeilen DataFrame:**")
         st.write(df_xp.head())
 
+    # ----------------------------------------------------------------
+    # RANGLISTE (ganze Klasse, einmal pro Snapshot berechnet)
+    # ----------------------------------------------------------------
+    if ansicht == "🏆 Rangliste":
+        with perf.span("dashboard"):
+            dashboard.show_dashboard(summary)
+        stop()
+
     st.info("Bitte Gamertag eingeben:")
     gamertag_inp = st.text_input("Gamertag:", placeholder="z.B. BrAnt")
 
@@ -120,58 +273,23 @@ try:
         if debug_mode:
             st.write(f"🔍 **DEBUG - Suche nach Gamertag:** '{user_tag}'")
         
-        # Gamertag-Spalte finden (zuerst Spalte 4, dann andere durchsuchen)
-        found_tag_col = -1
-        for col_i in [4] + list(range(len(df_xp.columns))):
-            if col_i >= len(df_xp.columns):
-                break
-            col_header = str(df_xp.iloc[0, col_i]).strip().lower()
-            if "gamertag" in col_header:
-                found_tag_col = col_i
-                if debug_mode:
-                    st.write(f"🔍 **DEBUG - Gamertag-Spalte gefunden bei Index:** {col_i}")
-                break
-        
-        if found_tag_col == -1:
-            st.error("Gamertag-Spalte nicht gefunden!")
-        else:
-            col_vals = df_xp.iloc[1:, found_tag_col].astype(str).str.strip().str.lower()
-            matches = col_vals[col_vals == user_tag].index
-            if debug_mode:
-                st.write(f"🔍 **DEBUG - Werte in Gamertag-Spalte (erste 10):** {list(col_vals.head(10))}")
-                st.write(f"🔍 **DEBUG - Matches gefunden:** {list(matches)}")
-            
-            if not matches.empty:
-                found_idx = matches[0]
-                row = df_xp.iloc[found_idx]
-                
-                # Extrahiere Name
-                try:
-                    first_name = str(row.iloc[0]).strip()
-                    last_name = str(row.iloc[1]).strip()
-                    real_name = f"{last_name} {first_name}"
-                except:
-                    real_name = "Unbekannt"
-                
-                # XP, Level, Stufe - Offsets hängen von Gamertag-Spalte ab
-                xp_col = found_tag_col + 3  # XP Bereich
-                lvl_col = found_tag_col + 4  # Level
-                stufe_col = found_tag_col + 5  # Stufe
-                
-                if xp_col < len(df_xp.columns):
-                    raw_xp = row.iloc[xp_col]
-                    raw_lvl = row.iloc[lvl_col] if lvl_col < len(df_xp.columns) else 0
-                    raw_info = str(row.iloc[stufe_col]) if stufe_col < len(df_xp.columns) else ""
-                    is_go = "💀" in str(raw_lvl) or "game" in raw_info.lower() or "over" in raw_info.lower()
-                    stats = {
-                        "xp": clean_number(raw_xp),
-                        "level": raw_lvl,
-                        "is_go": is_go
-                    }
-                    if debug_mode:
-                        st.write(f"🔍 **DEBUG - XP-Spalte:** {xp_col}, Wert: {raw_xp}")
-                        st.write(f"🔍 **DEBUG - Level-Spalte:** {lvl_col}, Wert: {raw_lvl}")
-                        st.write(f"🔍 **DEBUG - Stats gefunden:** {stats}")
+        # Die Gamertag-Spalte ist durch das XpLayout garantiert (sonst SchemaError beim Laden)
+        if debug_mode:
+            st.write(f"🔍 **DEBUG - Gamertag-Spalte gefunden bei Index:** {players.tag_col}")
+            st.write(f"🔍 **DEBUG - Werte in Gamertag-Spalte (erste 10):** {players.gamertags[:10]}")
+        with perf.span("login: lookup"):
+            player = players.lookup(user_tag)
+        if debug_mode:
+            st.write(f"🔍 **DEBUG - Treffer:** {player}")
+
+        if player:
+            found_idx = player.row
+            real_name = player.name
+            stats = {
+                "xp": player.xp,
+                "level": player.level,
+                "is_go": player.is_go
+            }
         
         if stats and found_idx != -1:
             lvl_display = str(stats["level"])
@@ -200,126 +318,43 @@ try:
             # ----------------------------------------------------------------
             # 2. QUESTBUCH (für Tabs 2 & 3)
             # ----------------------------------------------------------------
-            try:
-                df_q = pd.DataFrame(spreadsheet.worksheet(blatt_quests).get_all_values())
-            except:
-                st.warning("Questbuch nicht gefunden.")
-                st.stop()
-
-            # --- HEADERS ---
-            header_row = df_q.iloc[1]   # Zeile 2: Namen
-            master_xp_row = df_q.iloc[4] # Zeile 5: Soll-XP
-            
             # --- SCHÜLERSUCHE ---
-            q_row_idx = -1
-            search_str = real_name.lower()
-            for k in ["11t1", "11t2", "11t3", "11t4"]: 
-                search_str = search_str.replace(k.lower(), "")
-            parts = [p for p in search_str.split() if len(p) > 2]
-            if not parts: parts = [search_str]
-            
-            # Suche ab Zeile 7 (Index 6)
-            for i in range(6, len(df_q)):
-                r = df_q.iloc[i]
-                txt = " ".join([str(x) for x in r.iloc[0:4]]).lower()
-                match = True
-                for p in parts:
-                    if p not in txt: match = False; break
-                if match:
-                    q_row_idx = i; break
+            with perf.span("questbuch: name search"):
+                q_matches = names.find(real_name)
+            q_row_idx = q_matches[0] if q_matches else -1
+            if len(q_matches) > 1:
+                st.caption(f"⚠️ Mehrere Einträge im Questbuch passen zu '{real_name}' (Zeilen {', '.join(str(i + 1) for i in q_matches)}) – verwendet wird Zeile {q_row_idx + 1}.")
+            if debug_mode:
+                st.write(f"🔍 **DEBUG - Questbuch-Treffer für '{real_name}':** {q_matches}")
             
             # --- TAB 1: SHOP ---
+            st.sidebar.info(f"Shop geöffnet für: {gamertag_inp}")
             with tab1:
-                shop.show_shop(gamertag_inp, stats)
+                sync = get_purchase_sync()
+                if debug_mode:
+                    st.write(f"🔍 **DEBUG - Käufe:** {sync.stats}, offen: {sync.store.pending_count()}, Fehler: {sync.last_error}")
+                # Verdientes Gold: einmal pro Snapshot für alle Spieler berechnet, nur Differenzen gebucht
+                with perf.span("gold: earnings"):
+                    earnings = data[blatt_quests].derive(
+                        ("earnings", data[blatt_xp].version),
+                        lambda values: store.Earnings(players, names, quests)
+                    )
+                    get_shop_store().apply_earnings(earnings)
+                shop_tab(gamertag_inp, debug_mode)
 
             # --- TABS 2 & 3: QUESTS ---
             if q_row_idx != -1:
-                student_row = df_q.iloc[q_row_idx]
-                
-                # Collect quests
-                completed_quests = []
-                open_quests = []
-                processed_cols = set()
-                max_cols = len(header_row)
-                
-                # --- QUEST LOOP ---
-                for c in range(0, max_cols):
-                    if c in processed_cols: continue
-                    
-                    q_name = str(header_row.iloc[c])
-                    q_name_clean = q_name.strip().lower()
-                    
-                    # 1. STOP LOGIK
-                    if q_name_clean == "cp" or "gesamtsumme" in q_name_clean or "game-over?" in q_name_clean:
-                        break
-                    if "game" in q_name_clean and "over" in q_name_clean:
-                        break
-                    
-                    # 2. FILTER LOGIK
-                    if q_name == "nan" or not q_name.strip(): continue
-                    if q_name_clean in ["quest", "quest ", "kachel", "code", "levelaufstieg?", "bezeichnung"]: continue
-                    if any(s in q_name_clean for s in ["questart", "summe", "total", "gold"]): continue
-                    
-                    # Master XP
-                    master_xp = 0
-                    try:
-                        master_xp = clean_number(master_xp_row.iloc[c])
-                    except: pass
-                    
-                    # Schüler Daten
-                    student_xp = 0
-                    try:
-                        if c+1 < len(student_row):
-                            student_xp = clean_number(student_row.iloc[c+1])
-                    except: pass
-
-                    # Entscheidung
-                    is_completed = student_xp > 0
-                    display_xp = student_xp if is_completed else master_xp
-
-                    # Sammeln
-                    quest_entry = {"name": q_name, "xp": display_xp, "completed": is_completed}
-                    if is_completed:
-                        completed_quests.append(quest_entry)
-                    else:
-                        open_quests.append(quest_entry)
-                    
-                    processed_cols.add(c)
-                    processed_cols.add(c+1)
+                # Quest-Spalten + XP-Matrix: einmal pro Snapshot für die ganze Klasse geparst
+                with perf.span("quests: for_student"):
+                    open_quests, completed_quests = quests.for_student(q_row_idx)
 
                 # --- TAB 2: OFFENE QUESTS ---
-                with tab2:
-                    st.subheader("⌛ Offene Quests")
-                    if not open_quests:
-                        st.success("Keine offenen Quests mehr!")
-                    else:
-                        cols = st.columns(3)
-                        for idx, quest in enumerate(open_quests):
-                            with cols[idx % 3]:
-                                st.markdown(f"""
-                                <div style="border:2px solid #ccc; padding:20px; border-radius:10px; 
-                                            background-color:#f5f5f5; color:#333; margin-bottom:15px;">
-                                    <strong>{quest['name']}</strong><br>
-                                    🔒 {quest['xp']} XP
-                                </div>
-                                """, unsafe_allow_html=True)
+                with tab2, perf.span("render: open quests"):
+                    quest_tab("⌛ Offene Quests", open_quests, False, "Keine offenen Quests mehr!")
 
                 # --- TAB 3: ERLEDIGTE QUESTS ---
-                with tab3:
-                    st.subheader("✅ Erledigte Quests")
-                    if not completed_quests:
-                        st.info("Noch keine Quests erledigt.")
-                    else:
-                        cols = st.columns(3)
-                        for idx, quest in enumerate(completed_quests):
-                            with cols[idx % 3]:
-                                st.markdown(f"""
-                                <div style="border:2px solid #cfeadf; padding:20px; border-radius:10px; 
-                                            background-color:#e8f9ef; color:#0b6b3a; margin-bottom:15px;">
-                                    <strong>{quest['name']}</strong><br>
-                                    ✨ +{quest['xp']} XP
-                                </div>
-                                """, unsafe_allow_html=True)
+                with tab3, perf.span("render: completed quests"):
+                    quest_tab("✅ Erledigte Quests", completed_quests, True, "Noch keine Quests erledigt.")
 
             else:
                 st.warning(f"Konnte Daten für '{real_name}' im Questbuch nicht finden.")
@@ -328,6 +363,12 @@ try:
             st.error("Gamertag nicht gefunden.")
 
 except Exception as e:
-    st.error(f"Fehler: {e}")
+    if sheets.is_quota_error(e):
+        st.error("Google Sheets ist gerade überlastet. Bitte in einer Minute erneut versuchen.")
+    else:
+        st.error(f"Fehler: {e}")
     if debug_mode:
         st.exception(e)
+
+finally:
+    finish_trace()
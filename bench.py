@@ -0,0 +1,208 @@
+"""Reproduzierbare Benchmarks der Auswertungs-Pipeline gegen fake_sheets (ohne Google).
+
+    python bench.py                                   # Standard-Szenarien
+    python bench.py --students 30 5000 --quests 20 300 --repeat 7
+    python bench.py --latency 0.2                     # mit simulierter API-Latenz
+    python bench.py --check                           # zusätzlich Paritätsprüfungen (Exit-Code 1 bei Abweichung)
+
+Jeder Lauf wird an data/bench_results.jsonl angehängt (Commit, Szenario,
+Median/Minimum je Messpunkt); angezeigt wird die Abweichung zum letzten Lauf
+desselben Szenarios, damit Regressionen auffallen.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import fake_sheets
+import levels
+import questdata
+import sheets
+import shop
+
+RESULTS = "data/bench_results.jsonl"
+DEFAULT_SCENARIOS = [(30, 20), (500, 100), (5000, 300)]
+SAMPLE_LOGINS = 100  # Logins pro Messung bei lookup/Namenssuche/Quest-Liste
+# Zellen für die Paritätsprüfung: jede Gruppe läuft als eigene Spalte (eigener dtype-Zweig in
+# clean_number_series/is_checkbox_checked_series), "gemischt" deckt alle Zweige in einer Spalte ab
+PARITY_CELLS = {
+    "gemischt": [True, False, 3.7, -2.9, np.nan, pd.NA, None, "", 0, 5, np.int64(4), np.float32(2.5), 1e12,
+                 "1.000.0", " checked ", "1,5", "2.000", "-3", "-0,5", "12.0", "1.5e3", " 7 ", "abc",
+                 "TRUE", "wahr", "✓", "✅", "nan"],
+    "float": [3.7, -2.9, np.nan, 0.0, 12.0, -0.5],
+    "int": [1, 0, -3, 2000],
+    "bool": [True, False],
+    "int+NA": [1, pd.NA, 2.5],
+    "object-Zahlen": np.array([1, 2.5, None, True], dtype=object),
+    "text": ["1.000.0", " checked ", "x", "", "1,5", "1_000"],
+    # außerhalb von int64: Spaltenvariante begrenzt, Vergleich gegen den begrenzten Einzelwert
+    "groß": [10**20, -10**20, "100000000000000000000", "-100.000.000.000.000.000.000", 1e20, -1e20],
+    "groß-float": [1e20, -1e20, 9.3e18, 1.5],
+    "gleicher Hash": [2, np.int64(2), 2.0, True, 1],
+}
+
+
+def measure(fn, repeat):
+    """fn() repeat-mal ausführen -> {"median_ms", "min_ms"}."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(min(runs), 3)}
+
+
+def run_scenario(students, quests, repeat=5, latency=0.0):
+    """Alle Messpunkte für ein Szenario -> {Name: {"median_ms", "min_ms"}}."""
+    spreadsheet = fake_sheets.make_spreadsheet(students, quests, latency=latency, gold_column=True)
+    titles = [fake_sheets.XP_TITLE, fake_sheets.QUEST_TITLE]
+    loader = sheets.BatchLoader(column_spans={fake_sheets.XP_TITLE: questdata.xp_column_spans})
+    data = loader.fetch(spreadsheet, titles)
+    xp_values, book = data[fake_sheets.XP_TITLE], data[fake_sheets.QUEST_TITLE]
+
+    players = questdata.PlayerIndex(xp_values)
+    names = questdata.NameIndex(book)
+    matrix = questdata.QuestMatrix(book)
+    sample = [players.player(i) for i in range(0, len(players), max(1, len(players) // SAMPLE_LOGINS))]
+    sample = sample[:SAMPLE_LOGINS]
+    q_rows = [(names.find(p.name) or [-1])[0] for p in sample]
+    xp = players.xp.astype(np.int64)
+
+    def name_match():
+        names._found.clear()  # ohne gemerkte Treffer: echte Suchkosten
+        for p in sample:
+            names.find(p.name)
+
+    catalog = shop.get_catalog()
+    atlas = shop.SpriteAtlas(catalog.items)
+    inventory = [item["id"] for item in catalog.items]
+
+    return {
+        "fetch_batch": measure(lambda: loader.fetch(spreadsheet, titles), repeat),
+        "player_index": measure(lambda: questdata.PlayerIndex(xp_values), repeat),
+        "login_lookup": measure(lambda: [players.lookup(p.gamertag) for p in sample], repeat),
+        "name_index": measure(lambda: questdata.NameIndex(book), repeat),
+        "name_match": measure(name_match, repeat),
+        "quest_parse": measure(lambda: questdata.QuestMatrix(book), repeat),
+        "quest_lists": measure(lambda: [matrix.for_student(i) for i in q_rows if i != -1], repeat),
+        "progress_batch": measure(lambda: levels.progress_batch(xp), repeat),
+        "progress_single": measure(lambda: [levels.calculate_progress(p.xp) for p in sample], repeat),
+        "class_summary": measure(lambda: questdata.ClassSummary(players, names, matrix), repeat),
+        "avatar_atlas": measure(lambda: shop.SpriteAtlas(catalog.items), repeat),
+        "avatar_render": measure(lambda: atlas.render(inventory), repeat),
+        "avatar_png_cached": measure(lambda: shop.avatar_png(inventory, catalog), repeat),
+    }
+
+
+def check_parity(students=300, quests=60):
+    """Vektorisierte Auswertung gegen die Einzelwert-Funktionen -> Liste der Abweichungen."""
+    sheets_ = fake_sheets.make_sheets(students, quests, gold_column=True)
+    book = sheets_[fake_sheets.QUEST_TITLE]
+    problems = []
+    groups = dict(PARITY_CELLS, Questbuch=[c for row in book for c in row])
+    for group, cells in groups.items():
+        vector = questdata.clean_number_series(cells).tolist()
+        scalar = [questdata._clamp64(questdata.clean_number(c)) for c in cells]
+        diff = [(c, v, s) for c, v, s in zip(cells, vector, scalar) if v != s]
+        if diff:
+            problems.append(f"clean_number_series != clean_number ({group}): {diff[:3]}")
+        vector = questdata.is_checkbox_checked_series(cells).tolist()
+        scalar = [questdata.is_checkbox_checked(c) for c in cells]
+        diff = [(c, v, s) for c, v, s in zip(cells, vector, scalar) if v != s]
+        if diff:
+            problems.append(f"is_checkbox_checked_series != is_checkbox_checked ({group}): {diff[:3]}")
+    xp = np.arange(0, 60000, 37)
+    lvl, prog, _ = levels.progress_batch(xp)
+    if lvl.tolist() != [levels.level_for_xp(x) for x in xp.tolist()]:
+        problems.append("progress_batch: Level weicht ab")
+    if not np.allclose(prog, [levels.calculate_progress(x)[0] for x in xp.tolist()]):
+        problems.append("progress_batch: Fortschritt weicht ab")
+    matrix = questdata.QuestMatrix(book)
+    for i, row in enumerate(book[questdata.QUEST_FIRST_STUDENT_ROW:]):
+        for q, (col, _) in enumerate(matrix.columns):
+            if matrix.student_xp[i, q] != questdata.clean_number(row[col + 1]):
+                problems.append(f"QuestMatrix: Zeile {i}, Quest {q}")
+                break
+    return problems
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(path):
+    """Letzter gespeicherter Lauf pro Szenario."""
+    last = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                last[json.dumps(record["scenario"], sort_keys=True)] = record
+    return last
+
+
+def report(scenario, results, previous):
+    print(f"\n== {scenario['students']} Schüler, {scenario['quests']} Quests, Latenz {scenario['latency']} s ==")
+    for name, value in results.items():
+        line = f"  {name:<18} {value['median_ms']:>10.3f} ms  (min {value['min_ms']:.3f})"
+        before = previous["results"].get(name) if previous else None
+        if before and before["median_ms"] > 0:
+            change = 100.0 * (value["median_ms"] - before["median_ms"]) / before["median_ms"]
+            line += f"  {change:+6.1f} % ggü. {previous.get('commit') or 'letztem Lauf'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, nargs="+", help="Schülerzahlen (mit --quests kombiniert)")
+    parser.add_argument("--quests", type=int, nargs="+", help="Questzahlen")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Sekunden pro Fake-API-Aufruf")
+    parser.add_argument("--out", default=RESULTS, help="JSON-Lines-Datei für die Ergebnisse ('' = nicht speichern)")
+    parser.add_argument("--check", action="store_true", help="Paritätsprüfungen ausführen")
+    args = parser.parse_args()
+
+    if args.check:
+        problems = check_parity()
+        print("Parität: OK" if not problems else "Parität: " + "; ".join(problems))
+        if problems:
+            sys.exit(1)
+
+    if args.students or args.quests:
+        scenarios = list(itertools.product(args.students or [30], args.quests or [20]))
+    else:
+        scenarios = DEFAULT_SCENARIOS
+
+    previous = previous_results(args.out) if args.out else {}
+    commit = git_commit()
+    for students, quests in scenarios:
+        scenario = {"students": students, "quests": quests, "latency": args.latency, "repeat": args.repeat}
+        results = run_scenario(students, quests, args.repeat, args.latency)
+        report(scenario, results, previous.get(json.dumps(scenario, sort_keys=True)))
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "timestamp": time.time(),
+                    "commit": commit,
+                    "python": platform.python_version(),
+                    "scenario": scenario,
+                    "results": results,
+                }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import streamlit as st
+
+
+def show_dashboard(summary):
+    st.header("🏆 Rangliste")
+
+    klasse = st.selectbox("Klasse:", [summary.ALL] + summary.classes)
+    students = summary.students_for(klasse)
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Spieler", len(students))
+    c2.metric("Ø XP", int(students["XP"].mean()) if len(students) else 0)
+    c3.metric("💀 Game Over", int(students["Game Over"].sum()))
+
+    st.dataframe(
+        students.drop(columns=["Klasse"]) if klasse != summary.ALL else students,
+        hide_index=True,
+        column_config={
+            "Fortschritt": st.column_config.ProgressColumn("Fortschritt", min_value=0.0, max_value=1.0),
+            "Game Over": st.column_config.CheckboxColumn("💀"),
+        },
+    )
+
+    st.subheader("📊 Quests")
+    st.dataframe(
+        summary.quest_stats_for(klasse),
+        hide_index=True,
+        column_config={
+            "Quote %": st.column_config.ProgressColumn("Quote", min_value=0, max_value=100, format="%.0f %%"),
+        },
+    )
@@ -0,0 +1,263 @@
+"""Nachbildung der genutzten gspread-Oberfläche mit synthetischen Blättern (lokal, ohne Google).
+
+Liefert "XP Rechner 3.0" und "Questbuch 4.0" im Layout, das questdata erwartet,
+in beliebiger Größe (Schüler, Quests), optional mit künstlicher Latenz und
+429-Fehlern pro API-Aufruf. Gedacht für bench.py, Lasttests und lokales
+Ausprobieren; gezählt wird jeder Aufruf, der bei Google einer wäre.
+"""
+import collections
+import json
+import random
+import re
+import threading
+import time
+
+import gspread
+import requests
+
+import levels
+
+XP_TITLE = "XP Rechner 3.0"
+QUEST_TITLE = "Questbuch 4.0"
+XP_HEADER = ["Vorname", "Nachname", "Klasse", "Nr", "Gamertag", "Punkte", "Bonus", "XP", "Level", "Stufe"]
+
+FIRST_NAMES = [
+    "Anna", "Ben", "Clara", "David", "Emma", "Finn", "Greta", "Hannes", "Ida", "Jonas",
+    "Klara", "Luca", "Mia", "Noah", "Olivia", "Paul", "Quentin", "Rosa", "Samuel", "Tara",
+    "Ulrich", "Vera", "Wanda", "Xaver", "Yara", "Zoe", "Leon", "Lea", "Elias", "Marie",
+]
+LAST_NAMES = [
+    "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann",
+    "Koch", "Bauer", "Richter", "Klein", "Wolf", "Schröder", "Neumann", "Schwarz", "Zimmermann", "Braun",
+    "Krüger", "Hofmann", "Hartmann", "Lange", "Schmitt", "Werner", "Krause", "Meier", "Lehmann", "Huber",
+]
+
+_RANGE = re.compile(r"^'((?:[^']|'')*)'(?:!([A-Z]+):([A-Z]+))?$")
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def _german(n):
+    return f"{n:,}".replace(",", ".")
+
+
+def class_name(i):
+    """Klassenbezeichnung Nr. i: 11t1..11t4, danach 10t1.. usw."""
+    return f"{11 - i // 4}t{i % 4 + 1}"
+
+
+def roster(students, seed=0):
+    """Synthetische Schüler: [(Vorname, Nachname, Gamertag), ...], Namen möglichst eindeutig."""
+    rnd = random.Random(seed)
+    combos = [(f, l) for l in LAST_NAMES for f in FIRST_NAMES]
+    rnd.shuffle(combos)
+    result = []
+    for i in range(students):
+        first, last = combos[i % len(combos)]
+        if i >= len(combos):
+            last = f"{last}{i // len(combos)}"
+        result.append((first, last, f"{first[:3]}{last[:3]}{i}".lower()))
+    return result
+
+
+def make_sheets(students=30, quests=20, class_size=30, done_rate=0.4, gold_column=False, seed=0):
+    """-> {Blattname: Rohwerte} für XP Rechner und Questbuch (wie get_all_values())."""
+    rnd = random.Random(seed)
+    people = roster(students, seed)
+    master_xp = [rnd.choice([50, 100, 150, 200, 300, 500]) for _ in range(quests)]
+
+    width = 2 + 2 * quests + (1 if gold_column else 0) + 1
+    header = ["", ""]
+    for q in range(quests):
+        header += [f"Quest {q + 1}", ""]
+    if gold_column:
+        header.append("Gold")
+    header.append("Gesamtsumme")
+    master_row = [""] * width
+    for q, xp in enumerate(master_xp):
+        master_row[2 + 2 * q] = str(xp)
+    book = [[""] * width, header, [""] * width, [""] * width, master_row, [""] * width]
+
+    xp_rows = [["Spielerübersicht"] + [""] * (len(XP_HEADER) - 1), list(XP_HEADER)]
+    for i, (first, last, tag) in enumerate(people):
+        klasse = class_name(i // class_size)
+        row = [klasse, f"{last} {first}"] + [""] * (width - 2)
+        total = 0
+        for q, xp in enumerate(master_xp):
+            if rnd.random() < done_rate:
+                row[2 + 2 * q] = "x"
+                row[3 + 2 * q] = str(xp)
+                total += xp
+        if gold_column:
+            row[width - 2] = str(rnd.randint(0, 20))
+        row[width - 1] = _german(total)
+        book.append(row)
+        stufe = "game over" if rnd.random() < 0.02 else ""
+        xp_rows.append([first, last, klasse, str(i + 1), tag, "", "", _german(total),
+                        str(levels.level_for_xp(total)), stufe])
+    return {XP_TITLE: xp_rows, QUEST_TITLE: book}
+
+
+def quota_error(message="Quota exceeded (fake)"):
+    """Echter gspread.APIError mit Code 429, wie ihn die Sheets-API liefert."""
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps(
+        {"error": {"code": 429, "message": message, "status": "RESOURCE_EXHAUSTED"}}
+    ).encode()
+    return gspread.exceptions.APIError(response)
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, values):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.values = values
+
+    def get_all_values(self):
+        self.spreadsheet._api("get_all_values")
+        return [list(row) for row in self.values]
+
+    def col_values(self, col):
+        self.spreadsheet._api("col_values")
+        cells = [row[col - 1] if col - 1 < len(row) else "" for row in self.values]
+        while cells and cells[-1] == "":
+            cells.pop()
+        return cells
+
+    def append_rows(self, rows, value_input_option=None, insert_data_option=None):
+        self.spreadsheet._api("append_rows")
+        with self.spreadsheet._lock:
+            self.values.extend([str(v) for v in row] for row in rows)
+            self.spreadsheet.touch()
+
+    def append_row(self, row, **kwargs):
+        self.append_rows([row], **kwargs)
+
+
+class FakeSpreadsheet:
+    """Spreadsheet mit der von sheets.py genutzten Oberfläche; zählt Aufrufe in calls.
+
+    latency: Sekunden pro Aufruf; error_rate: Anteil der Aufrufe, die mit 429 scheitern.
+    fail_next(n) lässt die nächsten n Aufrufe gezielt scheitern.
+    """
+
+    def __init__(self, sheets, spreadsheet_id="fake", latency=0.0, error_rate=0.0, seed=0):
+        self.id = spreadsheet_id
+        self.title = "Fake"
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = collections.Counter()
+        self.errors = 0
+        self._worksheets = {title: FakeWorksheet(self, title, values) for title, values in sheets.items()}
+        self._rnd = random.Random(seed)
+        self._fail = 0
+        self._revision = 0
+        self._lock = threading.Lock()
+
+    def _api(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            fail = self._fail > 0 or (self.error_rate and self._rnd.random() < self.error_rate)
+            if self._fail > 0:
+                self._fail -= 1
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise quota_error()
+
+    def fail_next(self, n=1):
+        with self._lock:
+            self._fail += n
+
+    def touch(self):
+        """Markiert eine Änderung (neue modifiedTime), z.B. nach dem Bearbeiten von values."""
+        self._revision += 1
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def worksheet(self, title):
+        self._api("worksheet")
+        try:
+            return self._worksheets[title]
+        except KeyError:
+            raise gspread.exceptions.WorksheetNotFound(title) from None
+
+    def worksheets(self):
+        self._api("worksheets")
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title, rows=1, cols=1):
+        self._api("add_worksheet")
+        with self._lock:
+            ws = self._worksheets[title] = FakeWorksheet(self, title, [])
+            self.touch()
+        return ws
+
+    def get_lastUpdateTime(self):
+        self._api("get_lastUpdateTime")
+        return f"fake-revision-{self._revision}"
+
+    def values_batch_get(self, ranges, params=None):
+        self._api("values_batch_get")
+        out = []
+        for rng in ranges:
+            m = _RANGE.match(rng)
+            title = m.group(1).replace("''", "'")
+            values = self._worksheets[title].values
+            if m.group(2):
+                start, end = _col_index(m.group(2)), _col_index(m.group(3))
+                values = [row[start:end + 1] for row in values]
+            # wie die API: leere Zellen am Zeilenende und leere Zeilen am Ende fehlen
+            trimmed = []
+            for row in values:
+                row = list(row)
+                while row and row[-1] == "":
+                    row.pop()
+                trimmed.append(row)
+            while trimmed and not trimmed[-1]:
+                trimmed.pop()
+            out.append({"range": rng, "values": trimmed})
+        return {"spreadsheetId": self.id, "valueRanges": out}
+
+
+SPEC_TYPES = {"students": int, "quests": int, "class_size": int, "seed": int,
+              "latency": float, "error_rate": float, "done_rate": float}
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def parse_spec(spec):
+    """"students=300,quests=40,latency=0.1" -> Argumente für make_spreadsheet."""
+    kwargs = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key not in SPEC_TYPES:
+            raise ValueError(f"Unbekannte Fake-Option: {key}")
+        kwargs[key] = SPEC_TYPES[key](value)
+    return kwargs
+
+
+def shared(spec):
+    """Ein FakeSpreadsheet pro spec und Prozess – App und Lasttest sehen dieselben Zähler."""
+    with _shared_lock:
+        if spec not in _shared:
+            _shared[spec] = make_spreadsheet(**parse_spec(spec))
+        return _shared[spec]
+
+
+def make_spreadsheet(students=30, quests=20, latency=0.0, error_rate=0.0, seed=0, **kwargs):
+    """FakeSpreadsheet mit beiden Blättern in der gewünschten Größe."""
+    return FakeSpreadsheet(
+        make_sheets(students, quests, seed=seed, **kwargs), latency=latency, error_rate=error_rate, seed=seed
+    )
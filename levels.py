@@ -0,0 +1,62 @@
+"""Level-System: Schwellenwerte, Level und Fortschritt (einzeln oder für eine ganze Klasse)."""
+import bisect
+
+import numpy as np
+
+# Level-Tabelle
+LEVEL_THRESHOLDS = {
+    1: 0, 2: 42, 3: 143, 4: 332, 5: 640, 6: 1096, 7: 1728, 8: 2567,
+    9: 3640, 10: 4976, 11: 6602, 12: 8545, 13: 10831, 14: 13486, 15: 16536, 16: 20003
+}
+MAX_LEVEL = max(LEVEL_THRESHOLDS)
+
+# Sortierte Kopien der Tabelle für die Binärsuche
+_LEVELS = sorted(LEVEL_THRESHOLDS)
+_STARTS = [LEVEL_THRESHOLDS[lvl] for lvl in _LEVELS]
+_LEVELS_ARR = np.array(_LEVELS, dtype=np.int64)
+_STARTS_ARR = np.array(_STARTS, dtype=np.int64)
+
+
+def _level_pos(current_xp):
+    # Unter 0 XP bleibt es bei Level 1
+    return max(bisect.bisect_right(_STARTS, current_xp) - 1, 0)
+
+
+def level_for_xp(current_xp):
+    """Höchstes Level, dessen Schwelle erreicht ist."""
+    return _LEVELS[_level_pos(current_xp)]
+
+
+def calculate_progress(current_xp):
+    pos = _level_pos(current_xp)
+    if _LEVELS[pos] >= MAX_LEVEL:
+        return 1.0, "Maximales Level erreicht! 🏆"
+
+    current_level_start = _STARTS[pos]
+    next_level_start = _STARTS[pos + 1]
+
+    xp_gained = current_xp - current_level_start
+    xp_needed = next_level_start - current_level_start
+
+    if xp_needed <= 0: return 1.0, "Level Up!"
+
+    progress = max(0.0, min(1.0, xp_gained / xp_needed))
+    return progress, f"{int(xp_gained)} / {int(xp_needed)} XP zum nächsten Level"
+
+
+def progress_batch(xp_values):
+    """Für ein Array von XP-Werten: (Level, Fortschritt 0..1, fehlende XP bis zum nächsten Level).
+
+    Gleiche Regeln wie calculate_progress; im Maximallevel ist der Fortschritt 1.0
+    und es fehlen 0 XP.
+    """
+    xp = np.asarray(xp_values, dtype=np.float64)
+    pos = np.maximum(np.searchsorted(_STARTS_ARR, xp, side="right") - 1, 0)
+    at_max = _LEVELS_ARR[pos] >= MAX_LEVEL
+    start = _STARTS_ARR[pos]
+    nxt = _STARTS_ARR[np.minimum(pos + 1, len(_STARTS_ARR) - 1)]
+    needed = nxt - start
+    progress = np.clip((xp - start) / np.where(needed > 0, needed, 1), 0.0, 1.0)
+    progress = np.where(at_max | (needed <= 0), 1.0, progress)
+    remaining = np.where(at_max, 0, nxt - xp).astype(np.int64)
+    return _LEVELS_ARR[pos], progress, remaining
@@ -0,0 +1,232 @@
+"""Lasttest: viele gleichzeitige Sessions der Streamlit-App gegen fake_sheets (ohne Google).
+
+    python loadtest.py --sessions 30 --concurrency 10
+    python loadtest.py --sessions 120 --concurrency 30 --fake "students=500,quests=60,latency=0.2"
+
+Jede Session läuft headless über streamlit.testing (AppTest) im selben Prozess
+wie ein echter Server: Seite öffnen, Gamertag eingeben, im Shop kaufen.
+Alle Sessions teilen sich die Caches (cache_resource) und das Fake-Spreadsheet.
+Ausgegeben werden p50/p95/p99 der Rerun-Dauer (gesamt und pro Schritt),
+Sheets-Aufrufe pro Session und der Spitzen-Speicher des Prozesses.
+
+AppTest führt bei jedem Klick das ganze Skript aus, nie nur ein Fragment: der
+Schritt "buy" misst daher volle Reruns (obere Schranke), nicht die
+Fragment-Reruns, die Nutzer im Browser bekommen.
+"""
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import json
+import os
+import resource
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import fake_sheets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "app.py")
+FAKE_DATA_DIR = os.path.join(HERE, "data", "fake")
+DEFAULT_SPEC = "students=300,quests=40,latency=0.1"
+STEP_TIMEOUT = 120  # Sekunden pro Rerun, bevor AppTest abbricht
+# Klicks in Fragmenten, die AppTest trotzdem als vollen Rerun ausführt
+FULL_RERUN_STEPS = {"buy"}
+
+
+@contextlib.contextmanager
+def shared_apptest_runtime():
+    """Macht AppTest für parallele Sessions in Threads nutzbar.
+
+    AppTest ist für einen Lauf zur Zeit gebaut: jeder Lauf setzt eine globale
+    Runtime und setzt sie am Ende wieder auf None, patcht die Config für seine
+    Dauer, und ast.parse ist unter Python 3.11 nicht threadsicher. Hier gilt
+    für die Dauer des Tests: die zuletzt gesetzte Runtime bleibt sichtbar, die
+    Config wird einmal für alle gepatcht, das Kompilieren des Skripts läuft
+    unter einer Sperre.
+    """
+    import streamlit
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import magic
+    from streamlit.testing.v1 import app_test, util
+
+    # Interne Streamlit-Stellen, geschrieben gegen Streamlit 1.65
+    missing = [
+        name for obj, name in (
+            (Runtime, "instance"), (Runtime, "exists"), (Runtime, "_instance"), (magic, "add_magic"),
+            (app_test, "patch_config_options"), (util, "patch_config_options"),
+        ) if not hasattr(obj, name)
+    ]
+    if missing or not isinstance(Runtime.__dict__.get("instance"), classmethod):
+        raise RuntimeError(
+            f"loadtest.py passt nicht zu Streamlit {streamlit.__version__} (geschrieben für 1.65): "
+            f"fehlende interne Attribute {missing or ['Runtime.instance als classmethod']}"
+        )
+
+    last = []
+    original = {name: Runtime.__dict__[name] for name in ("instance", "exists")}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        return original["instance"].__func__(cls)
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    parse_lock = threading.Lock()
+    add_magic = magic.add_magic
+
+    def locked_add_magic(*args, **kwargs):
+        with parse_lock:
+            return add_magic(*args, **kwargs)
+
+    patch_config = app_test.patch_config_options
+    Runtime.instance, Runtime.exists = classmethod(instance), classmethod(exists)
+    magic.add_magic = locked_add_magic
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    try:
+        with util.patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        Runtime.instance, Runtime.exists = original["instance"], original["exists"]
+        magic.add_magic = add_magic
+        app_test.patch_config_options = patch_config
+
+
+class Session:
+    """Eine simulierte Schülerin / ein simulierter Schüler; misst jeden Rerun."""
+
+    def __init__(self, tag):
+        from streamlit.testing.v1 import AppTest
+        self.tag = tag
+        self.at = AppTest.from_file(APP, default_timeout=STEP_TIMEOUT)
+        self.timings = []  # [(Schritt, ms)]
+        self.errors = []
+
+    def _step(self, name, action):
+        start = time.perf_counter()
+        action()
+        self.timings.append((name, (time.perf_counter() - start) * 1000))
+        self.errors += [f"{name}: {e.value}" for e in self.at.exception]
+        self.errors += [f"{name}: {e.value}" for e in self.at.error if "Nicht genug Gold" not in e.value]
+
+    def run(self):
+        at = self.at
+        self._step("open", at.run)
+        if not at.text_input:
+            self.errors.append("open: keine Gamertag-Eingabe")
+            return self
+        self._step("login", lambda: at.text_input[0].input(self.tag).run())
+        buttons = [b for b in at.button if (b.key or "").startswith("buy_")]
+        if buttons:
+            self._step("buy", lambda: buttons[0].click().run())
+        return self
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+            "max_ms": round(max(values), 1)}
+
+
+def peak_memory_mb():
+    # ru_maxrss: Kilobyte unter Linux, Byte unter macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+
+
+def run(sessions, concurrency, spec, ramp=0.0, fresh=True):
+    os.environ["QUESTLOG_FAKE_SHEETS"] = spec
+    os.chdir(HERE)  # relative Pfade der App (data/...) wie beim normalen Start
+    if fresh:
+        shutil.rmtree(FAKE_DATA_DIR, ignore_errors=True)
+
+    options = fake_sheets.parse_spec(spec)
+    tags = [tag for _, _, tag in fake_sheets.roster(options.get("students", 30), options.get("seed", 0))]
+    spreadsheet = fake_sheets.shared(spec)
+    calls_before = spreadsheet.total_calls()
+    memory_before = peak_memory_mb()
+    lock = threading.Lock()
+    done = []
+
+    def one(i):
+        if ramp:
+            time.sleep(ramp * i / sessions)
+        session = Session(tags[i % len(tags)]).run()
+        with lock:
+            done.append(session)
+
+    start = time.perf_counter()
+    with shared_apptest_runtime(), concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one, i) for i in range(sessions)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    by_step = collections.defaultdict(list)
+    for session in done:
+        for name, ms in session.timings:
+            by_step[name].append(ms)
+    all_ms = [ms for values in by_step.values() for ms in values]
+    calls = spreadsheet.total_calls() - calls_before
+    return {
+        "spec": spec,
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "reruns": percentiles(all_ms),
+        "steps": {name: percentiles(values) for name, values in by_step.items()},
+        "sheets_calls": calls,
+        "sheets_calls_per_session": round(calls / sessions, 3),
+        "sheets_calls_by_method": dict(spreadsheet.calls),
+        "fake_errors": spreadsheet.errors,
+        "session_errors": sum(len(s.errors) for s in done),
+        "first_errors": [e for s in done for e in s.errors][:5],
+        "peak_memory_mb": peak_memory_mb(),
+        "memory_before_mb": memory_before,
+    }
+
+
+def report(result):
+    print(f"\n{result['sessions']} Sessions, {result['concurrency']} gleichzeitig, Fake: {result['spec']}")
+    print(f"Dauer: {result['wall_s']} s")
+    r = result["reruns"]
+    print(f"Reruns gesamt: n={r['n']}  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  p99 {r['p99_ms']} ms  max {r['max_ms']} ms")
+    for name, p in result["steps"].items():
+        note = "  (voller Rerun, im Browser nur Fragment)" if name in FULL_RERUN_STEPS else ""
+        print(f"  {name:<11} n={p['n']:<4} p50 {p['p50_ms']:>8} ms  p95 {p['p95_ms']:>8} ms  p99 {p['p99_ms']:>8} ms{note}")
+    print(f"Sheets-Aufrufe: {result['sheets_calls']} ({result['sheets_calls_per_session']} pro Session) "
+          f"{result['sheets_calls_by_method']}")
+    print(f"Fehler: {result['session_errors']} in Sessions, {result['fake_errors']} simulierte 429")
+    for e in result["first_errors"]:
+        print(f"  {e}")
+    print(f"Spitzen-Speicher (RSS): {result['peak_memory_mb']} MB (vor dem Test {result['memory_before_mb']} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fake", default=DEFAULT_SPEC, help="Fake-Spreadsheet, siehe fake_sheets.parse_spec")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Sekunden, über die die Sessions verteilt starten")
+    parser.add_argument("--keep-data", action="store_true", help="data/fake (Offline-Stand, Shop-DB) nicht löschen")
+    parser.add_argument("--out", help="Ergebnis zusätzlich als JSON-Zeile anhängen")
+    args = parser.parse_args()
+
+    result = run(args.sessions, args.concurrency, args.fake, args.ramp, fresh=not args.keep_data)
+    report(result)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(result, timestamp=time.time())) + "\n")
+
+
+if __name__ == "__main__":
+    main()
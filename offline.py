@@ -0,0 +1,180 @@
+"""Offline-Stand: die zuletzt ausgewerteten Sheet-Daten als Arrow-Dateien (Kaltstart + Ausfall-Reserve).
+
+Gespeichert werden nicht die Rohwerte, sondern die fertigen Indizes:
+players (XP Rechner), students (Questbuch-Zeilen), quests + matrix (Quest-Matrix).
+Beim Laden werden die Dateien memory-mapped gelesen und als Snapshots ohne
+Rohwerte, aber mit vorbelegten Ableitungen "players", "names" und "quests"
+zurückgegeben – dieselben Schlüssel wie in app.build_indexes.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+
+import questdata
+import sheets
+
+META_FILE = "meta.json"
+
+_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def _write_table(path, table):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path):
+    # memory-mapped: Zahlen-Spalten liegen ohne Kopie in der Datei (siehe _numbers)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _numbers(column):
+    """Zahlen-Spalte als numpy-Array; bei einem Chunk ohne Nullwerte eine Sicht auf die gemappte Datei."""
+    if column.num_chunks == 1 and column.null_count == 0:
+        return column.chunk(0).to_numpy()
+    return column.to_numpy()
+
+
+def _matrix(table, students, quests):
+    """XP-Matrix (Schüler x Quests); im aktuellen Format eine Sicht ohne Kopie auf die gemappte Datei."""
+    if table.column_names == ["xp"]:
+        column = table.column("xp")
+        values = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        return _numbers(pa.chunked_array([values.flatten()])).reshape(students, quests)
+    # älteres Format: eine Spalte pro Quest
+    student_xp = np.zeros((students, quests), dtype=np.int32)
+    for i in range(table.num_columns):
+        student_xp[:, i] = table.column(i).to_numpy()
+    return student_xp
+
+
+def save(directory, spreadsheet_id, titles, snaps, players, names, quests):
+    """Schreibt den ausgewerteten Stand; titles = (XP-Blatt, Questbuch), snaps = {Blattname: Snapshot}.
+
+    Die Dateien einer Generation werden zuerst komplett geschrieben, dann zeigt
+    meta.json atomar auf sie; ältere Generationen werden danach gelöscht.
+    """
+    xp_title, q_title = titles
+    with _lock:
+        os.makedirs(directory, exist_ok=True)
+        gen = time.time_ns()
+        tables = {
+            "players": pa.table({
+                "row": pa.array(players.rows, pa.int32()),
+                "name": players.names,
+                "klasse": pa.array(players.klasse),
+                "gamertag": players.gamertags,
+                "xp": pa.array(players.xp, pa.int32()),
+                "level": players.level,
+                "is_go": pa.array(players.is_go, pa.bool_()),
+            }),
+            "students": pa.table({
+                "row": pa.array(names.rows, pa.int32()),
+                "text": names.texts,
+                "gold": pa.array(quests.gold, pa.int32()),
+            }),
+            "quests": pa.table({
+                "col": pa.array([c for c, _ in quests.columns], pa.int32()),
+                "name": quests.names,
+                "master_xp": pa.array(quests.master_xp, pa.int32()),
+            }),
+            # eine Zeile pro Schüler mit fester Länge: beim Laden als eine zusammenhängende Matrix lesbar
+            "matrix": pa.table({"xp": pa.FixedSizeListArray.from_arrays(
+                pa.array(quests.student_xp.ravel(), pa.int32()), len(quests)
+            )}),
+        }
+        for name, table in tables.items():
+            _write_table(os.path.join(directory, f"{name}-{gen}.arrow"), table)
+
+        meta = {
+            "generation": gen,
+            "saved_at": time.time(),
+            "spreadsheet_id": spreadsheet_id,
+            "tag_col": players.tag_col,
+            "sheets": {
+                key: {"title": title, "revision": snaps[title].revision, "loaded_at": snaps[title].loaded_at}
+                for key, title in (("xp", xp_title), ("quests", q_title))
+            },
+        }
+        tmp = os.path.join(directory, META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, META_FILE))
+
+        for path in glob.glob(os.path.join(directory, "*.arrow")):
+            if not path.endswith(f"-{gen}.arrow"):
+                os.remove(path)
+
+
+def save_quietly(*args):
+    """save() für Hintergrund-Threads: Fehler werden nur protokolliert."""
+    try:
+        save(*args)
+    except Exception:
+        log.exception("Offline-Stand konnte nicht gespeichert werden")
+
+
+def load(directory, spreadsheet_id):
+    """Liest den Offline-Stand -> {Blattname: Snapshot} oder None, wenn keiner (passender) lesbar ist.
+
+    Die Snapshots sind als abgelaufen (checked_at = 0) und mit offline=True
+    markiert: der erste Zugriff prüft sofort bei Google Sheets nach, der
+    Offline-Stand dient nur als Reserve, falls das scheitert.
+    """
+    try:
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("spreadsheet_id") != spreadsheet_id:
+            return None
+        gen = meta["generation"]
+        tables = {
+            name: _read_table(os.path.join(directory, f"{name}-{gen}.arrow"))
+            for name in ("players", "students", "quests", "matrix")
+        }
+        return _snapshots(meta, tables)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Beschädigter oder unpassender Stand: ohne Offline-Reserve starten statt bei jedem Rerun abzustürzen
+        log.exception("Offline-Stand konnte nicht gelesen werden")
+        return None
+
+
+def _snapshots(meta, tables):
+    """meta.json + Arrow-Tabellen -> {Blattname: Snapshot} mit vorbelegten Indizes."""
+    # Texte werden zu Python-Strings (die Indizes arbeiten damit); Zahlen bleiben Sichten auf die Datei
+    p = tables["players"]
+    players = questdata.PlayerIndex.from_columns(
+        meta["tag_col"], _numbers(p.column("row")), p.column("name").to_pylist(),
+        p.column("klasse").to_pylist(), p.column("gamertag").to_pylist(), _numbers(p.column("xp")),
+        p.column("level").to_pylist(), p.column("is_go").to_numpy(),
+    )
+    students = tables["students"]
+    names = questdata.NameIndex.from_texts(
+        students.column("row").to_pylist(), students.column("text").to_pylist()
+    )
+    q = tables["quests"]
+    quests = questdata.QuestMatrix.from_arrays(
+        zip(q.column("col").to_pylist(), q.column("name").to_pylist()),
+        _numbers(q.column("master_xp")),
+        _matrix(tables["matrix"], students.num_rows, q.num_rows),
+        _numbers(students.column("gold")) if "gold" in students.column_names else None,
+    )
+
+    snaps = {}
+    for key, derived in (("xp", {"players": players}), ("quests", {"names": names, "quests": quests})):
+        info = meta["sheets"][key]
+        snap = sheets.Snapshot(None, loaded_at=info["loaded_at"], revision=info["revision"], derived=derived)
+        snap.checked_at = 0.0
+        snap.offline = True
+        snaps[info["title"]] = snap
+    return snaps
@@ -0,0 +1,101 @@
+"""Zeitmessung der Pipeline-Schritte pro Rerun (Debug-Wasserfall + optionales JSON-Lines-Log).
+
+Ein Rerun beginnt mit start() und endet mit finish(); dazwischen misst
+span("Name") beliebige Abschnitte, auch in sheets/questdata/shop, ohne dass
+der Trace durchgereicht werden muss (er hängt am Skript-Thread der Session).
+Ist die Messung aus, liefert span() einen gemeinsamen No-op-Kontext – die
+Kosten sind dann ein Attributzugriff pro Aufruf.
+"""
+import contextlib
+import json
+import threading
+import time
+
+_current = threading.local()
+_NOOP = contextlib.nullcontext()
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """Alle Spans eines Reruns: [(Name, Start ms, Dauer ms, Tiefe)], Start relativ zum Rerun-Beginn."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._depth = 0
+        self.spans = []
+        self.total_ms = None
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        entry = [name, (start - self._t0) * 1000, None, self._depth]
+        self.spans.append(entry)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            entry[2] = (time.perf_counter() - start) * 1000
+
+    def finish(self):
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self._t0) * 1000
+        return self
+
+    def record(self):
+        """Als dict für das JSON-Lines-Log."""
+        return {
+            "ts": round(self.started_at, 3),
+            "total_ms": round(self.total_ms or 0.0, 3),
+            "spans": [
+                {"name": name, "start_ms": round(start, 3), "ms": round(ms or 0.0, 3), "depth": depth}
+                for name, start, ms, depth in self.spans
+            ],
+        }
+
+
+def start(enabled=True):
+    """Neuer Trace für diesen Rerun (None, wenn die Messung aus ist)."""
+    trace = Trace() if enabled else None
+    _current.trace = trace
+    return trace
+
+
+def current():
+    return getattr(_current, "trace", None)
+
+
+def span(name):
+    """Misst den with-Block im laufenden Trace; ohne Trace ein No-op."""
+    trace = getattr(_current, "trace", None)
+    if trace is None:
+        return _NOOP
+    return trace.span(name)
+
+
+def finish(log_path=None):
+    """Beendet den Trace des Reruns; hängt ihn an log_path an (JSON Lines), falls angegeben."""
+    trace = getattr(_current, "trace", None)
+    _current.trace = None
+    if trace is None:
+        return None
+    trace.finish()
+    if log_path:
+        line = json.dumps(trace.record())
+        with _log_lock, open(log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    return trace
+
+
+def waterfall(trace, width=24):
+    """Zeilen für die Anzeige: (Schritt eingerückt, Start ms, Dauer ms, Balken aus Blockzeichen)."""
+    total = max(trace.total_ms or 0.0, 1e-9)
+    rows = []
+    for name, start, ms, depth in trace.spans:
+        ms = ms or 0.0
+        offset = int(start / total * width)
+        length = max(1, round(ms / total * width))
+        rows.append(("│ " * depth + name, round(start, 1), round(ms, 1),
+                     "·" * offset + "█" * min(length, width - offset)))
+    return rows
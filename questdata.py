@@ -0,0 +1,607 @@
+"""Auswertung der Sheet-Inhalte ("XP Rechner 3.0" + "Questbuch 4.0")."""
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import levels
+
+
+CHECKBOX_TRUE = ["TRUE", "WAHR", "1", "CHECKED", "YES", "ON"]
+
+
+def clean_number(val):
+    """Macht aus allem sicher eine Zahl."""
+    if pd.isna(val) or str(val).strip() == "":
+        return 0
+    if isinstance(val, (int, float)):
+        return int(val)
+    s = str(val).strip()
+    if s.endswith(".0"): s = s[:-2]
+    s = s.replace('.', '').replace(',', '.')
+    try:
+        return int(float(s))
+    except:
+        return 0
+
+def is_checkbox_checked(val):
+    """Prüft auf Checkboxen (True, 1, WAHR, CHECKED)."""
+    if pd.isna(val): return False
+    if isinstance(val, bool): return val
+    if isinstance(val, (int, float)): return val >= 1
+    s = str(val).strip().upper()
+    return s in CHECKBOX_TRUE
+
+
+# --- Spaltenweise Varianten (gleiche Regeln, aber für ganze Series/Arrays) ---
+# Object-Spalten werden faktorisiert: die Einzelwert-Funktion läuft nur einmal pro
+# unterschiedlichem Zellwert, das Ergebnis ist damit per Konstruktion dasselbe.
+# Einzige Abweichung: Zahlen außerhalb von int64 werden auf den int64-Bereich begrenzt.
+
+INT64_MIN, INT64_MAX = int(np.iinfo(np.int64).min), int(np.iinfo(np.int64).max)
+
+
+def _factorize(s):
+    """(Codes, eindeutige Werte) einer object-Series; fehlende Werte -> Code -1.
+
+    Bei gemischten Typen wird nach (Typ, Wert) unterschieden, weil z.B. 2 und
+    np.int64(2) gleich hashen, von den Einzelwert-Funktionen aber verschieden
+    behandelt werden.
+    """
+    if pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        return codes, list(uniques)
+    missing = s.isna().to_numpy()
+    keys = pd.Series([(type(v), v) for v in s], dtype=object)
+    codes, uniques = pd.factorize(keys)
+    codes[missing] = -1
+    return codes, [v for _, v in uniques]
+
+
+def _clamp64(value):
+    return min(max(value, INT64_MIN), INT64_MAX)
+
+
+def _truncate(numbers):
+    """float-Array -> int64 wie int(); NaN/unendlich -> 0, außerhalb von int64 begrenzt."""
+    numbers = np.trunc(np.asarray(numbers, dtype=float))
+    numbers[~np.isfinite(numbers)] = 0
+    high, low = numbers >= 2.0 ** 63, numbers < -(2.0 ** 63)
+    out = np.where(high | low, 0, numbers).astype(np.int64)
+    out[high], out[low] = INT64_MAX, INT64_MIN
+    return out
+
+
+def clean_number_series(values):
+    """clean_number für eine ganze Spalte (Series/Array/Liste) -> int64-Array."""
+    s = pd.Series(values, copy=False)
+    if s.dtype.kind == "b":
+        return s.to_numpy(dtype=np.int64)
+    if s.dtype.kind == "i":
+        return s.to_numpy(dtype=np.int64)
+    if s.dtype.kind == "u":
+        return np.minimum(s.to_numpy(), INT64_MAX).astype(np.int64)
+    if s.dtype.kind == "f":
+        return _truncate(s.to_numpy(dtype=float, na_value=np.nan))
+    codes, uniques = _factorize(s)
+    mapped = np.array([_clamp64(clean_number(v)) for v in uniques] + [0], dtype=np.int64)
+    return mapped[codes]  # Code -1 (fehlend) -> angehängte 0
+
+
+def is_checkbox_checked_series(values):
+    """is_checkbox_checked für eine ganze Spalte (Series/Array/Liste) -> bool-Array."""
+    s = pd.Series(values, copy=False)
+    if s.dtype.kind == "b":
+        return s.to_numpy(dtype=bool)
+    if s.dtype.kind in "iuf":
+        return (s >= 1).to_numpy(dtype=bool)
+    codes, uniques = _factorize(s)
+    mapped = np.array([bool(is_checkbox_checked(v)) for v in uniques] + [False], dtype=bool)
+    return mapped[codes]
+
+
+def _int32(values):
+    """int32-Array; int32-Eingaben ohne Kopie, größere Werte auf den int32-Bereich begrenzt."""
+    values = np.asarray(values)
+    if values.dtype == np.int32:
+        return values
+    info = np.iinfo(np.int32)
+    return np.clip(values.astype(np.int64), info.min, info.max).astype(np.int32)
+
+
+def normalize_tag(tag):
+    return str(tag).strip().lower()
+
+
+class SchemaError(ValueError):
+    """Der Aufbau eines Blatts passt nicht (mehr) zu dem, was die App erwartet."""
+
+
+def _column_label(c):
+    """0-basierter Spaltenindex -> Spaltenbuchstabe wie im Blatt (0 -> A)."""
+    label = ""
+    c += 1
+    while c:
+        c, rest = divmod(c - 1, 26)
+        label = chr(65 + rest) + label
+    return label
+
+
+# Im Blatt "XP Rechner" steht die Kopfzeile in Zeile 2 (Index 1)
+XP_HEADER_ROW = 1
+
+
+def find_gamertag_col(values):
+    """Sucht die Gamertag-Spalte in der Kopfzeile (zuerst Spalte 4, dann alle anderen). -1 = nicht gefunden."""
+    if len(values) <= XP_HEADER_ROW:
+        return -1
+    header = values[XP_HEADER_ROW]
+    for col_i in [4] + list(range(len(header))):
+        if col_i >= len(header):
+            break
+        if "gamertag" in str(header[col_i]).strip().lower():
+            return col_i
+    return -1
+
+
+class XpLayout:
+    """Aufbau des XP Rechners, einmal pro Snapshot erkannt und geprüft.
+
+    Namen in A/B, Klasse in C, Gamertag laut Kopfzeile; XP, Level und Stufe
+    stehen 3, 4 und 5 Spalten rechts vom Gamertag. Level/Stufe sind optional
+    (None, wenn das Blatt schmaler ist). Wirft SchemaError, wenn Gamertag- oder
+    XP-Spalte fehlen.
+    """
+
+    def __init__(self, values):
+        self.tag_col = find_gamertag_col(values)
+        if self.tag_col == -1:
+            raise SchemaError(f"XP Rechner: keine Spalte 'Gamertag' in Zeile {XP_HEADER_ROW + 1} gefunden")
+        self.width = len(values[XP_HEADER_ROW])
+        self.xp_col = self.tag_col + 3
+        if self.xp_col >= self.width:
+            raise SchemaError(
+                f"XP Rechner: XP-Spalte {_column_label(self.xp_col)} fehlt "
+                f"(3 Spalten rechts vom Gamertag in {_column_label(self.tag_col)})"
+            )
+        self.level_col = self.tag_col + 4 if self.tag_col + 4 < self.width else None
+        self.stufe_col = self.tag_col + 5 if self.tag_col + 5 < self.width else None
+        self.klasse_col = 2 if self.width > 2 else None
+        self.rows = range(XP_HEADER_ROW + 1, len(values))
+
+    def spans(self):
+        """Spaltenbereiche, die gebraucht werden: Namen + Klasse (A:C) und Gamertag bis Stufe (+5)."""
+        if self.tag_col <= 3:
+            return [(0, self.tag_col + 6)]
+        return [(0, 3), (self.tag_col, self.tag_col + 6)]
+
+
+def xp_column_spans(values):
+    """column_spans-Funktion für den BatchLoader; None (= ganzes Blatt laden), solange das Layout nicht passt."""
+    try:
+        return XpLayout(values).spans()
+    except SchemaError:
+        return None
+
+
+class Player:
+    """Ein Spieler aus dem PlayerIndex (nur für Einzelzugriffe, z.B. Login)."""
+
+    __slots__ = ("row", "name", "klasse", "gamertag", "xp", "level", "is_go")
+
+    def __init__(self, row, name, klasse, gamertag, xp, level, is_go):
+        self.row = row
+        self.name = name
+        self.klasse = klasse
+        self.gamertag = gamertag
+        self.xp = xp
+        self.level = level
+        self.is_go = is_go
+
+    def __repr__(self):
+        return f"Player({self.gamertag!r}, {self.name!r}, {self.klasse!r}, xp={self.xp}, level={self.level!r})"
+
+
+class PlayerIndex:
+    """Gamertag -> Spieler, einmal pro Snapshot des XP Rechners aufgebaut und von allen Sessions geteilt.
+
+    Gespeichert wird spaltenweise, eine Position pro Spieler: keys (normalisierte
+    Gamertags), gamertags, names (interniert), klasse (pd.Categorical), xp (int32),
+    level (Rohwert als internierter Text), is_go (bool) und rows (Zeilenindex wie
+    im bisherigen DataFrame = Blattzeile - 1). lookup() liefert einen Player.
+    Bei doppelten Gamertags gewinnt die erste Zeile. Die Spalten kommen aus dem XpLayout.
+    """
+
+    def __init__(self, values, layout=None):
+        layout = layout or XpLayout(values)
+        tag_col, xp_col, lvl_col, stufe_col, klasse_col = (
+            layout.tag_col, layout.xp_col, layout.level_col, layout.stufe_col, layout.klasse_col
+        )
+        seen = set()
+        rows, names, klasse, gamertags, xp, level, is_go = [], [], [], [], [], [], []
+        for sheet_row in layout.rows:
+            row = values[sheet_row]
+            tag = normalize_tag(row[tag_col])
+            if not tag or tag in seen:
+                continue
+            seen.add(tag)
+            raw_lvl = str(row[lvl_col]) if lvl_col is not None else "0"
+            raw_info = str(row[stufe_col]).lower() if stufe_col is not None else ""
+            rows.append(sheet_row - 1)
+            names.append(f"{str(row[1]).strip()} {str(row[0]).strip()}")
+            klasse.append(str(row[klasse_col]).strip() if klasse_col is not None else "")
+            gamertags.append(str(row[tag_col]).strip())
+            xp.append(row[xp_col])
+            level.append(raw_lvl)
+            is_go.append("💀" in raw_lvl or "game" in raw_info or "over" in raw_info)
+        self._set(layout.tag_col, rows, names, klasse, gamertags, clean_number_series(xp), level, is_go)
+
+    @classmethod
+    def from_columns(cls, tag_col, rows, names, klasse, gamertags, xp, level, is_go):
+        """Index aus bereits ausgewerteten Spalten (z.B. aus dem Offline-Stand)."""
+        index = cls.__new__(cls)
+        index._set(tag_col, rows, names, klasse, gamertags, xp, level, is_go)
+        return index
+
+    def _set(self, tag_col, rows, names, klasse, gamertags, xp, level, is_go):
+        intern = sys.intern
+        self.tag_col = tag_col
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.names = [intern(n) for n in names]
+        self.klasse = pd.Categorical(klasse)
+        self.gamertags = [intern(t) for t in gamertags]
+        self.keys = [intern(normalize_tag(t)) for t in gamertags]
+        self.xp = _int32(xp)
+        self.level = [intern(str(lvl)) for lvl in level]
+        self.is_go = np.asarray(is_go, dtype=bool)
+        self._pos = {key: i for i, key in enumerate(self.keys)}
+        # Einzelzugriffe auf das Categorical sind langsam -> Codes und Kategorien für player() vorhalten
+        self._klasse_codes = self.klasse.codes
+        self._klassen = [intern(k) for k in self.klasse.categories]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def player(self, i):
+        """Spieler an Position i als Player."""
+        code = self._klasse_codes[i]
+        klasse = self._klassen[code] if code >= 0 else ""
+        return Player(int(self.rows[i]), self.names[i], klasse, self.gamertags[i],
+                      int(self.xp[i]), self.level[i], bool(self.is_go[i]))
+
+    def lookup(self, gamertag):
+        """O(1)-Suche nach Gamertag (Groß-/Kleinschreibung und Leerzeichen egal). None = nicht gefunden."""
+        i = self._pos.get(normalize_tag(gamertag))
+        return None if i is None else self.player(i)
+
+
+# Questbuch: Zeile 2 (Index 1) = Quest-Namen, Zeile 5 (Index 4) = Soll-XP,
+# Schüler-Zeilen ab Zeile 7 (Index 6), Namen in Spalte A-D
+QUEST_HEADER_ROW = 1
+QUEST_MASTER_XP_ROW = 4
+QUEST_FIRST_STUDENT_ROW = 6
+CLASS_TAGS = ["11t1", "11t2", "11t3", "11t4"]
+
+
+def _strip_class_tags(text):
+    for k in CLASS_TAGS:
+        text = text.replace(k, "")
+    return text
+
+
+def name_search_parts(real_name):
+    """Suchbegriffe aus "Nachname Vorname": Klassenkürzel entfernt, nur Teile mit mehr als 2 Zeichen."""
+    search_str = _strip_class_tags(real_name.lower())
+    parts = [p for p in search_str.split() if len(p) > 2]
+    return parts or [search_str]
+
+
+class NameIndex:
+    """Token-Index über die Schüler-Zeilen des Questbuchs, einmal pro Snapshot aufgebaut.
+
+    Ein Name passt auf eine Zeile, wenn alle Suchbegriffe als Teilstring im Text
+    der Spalten A-D vorkommen ("müller" passt also auch auf "Müllerova"). Ein
+    Suchbegriff ohne Leerzeichen kann nur innerhalb eines Worts liegen: über
+    einen Trigramm-Index (3 Zeichen -> Wörter) werden nur die Wörter geprüft, die
+    das seltenste Trigramm des Begriffs enthalten, nicht alle Zeilen. Kürzere
+    Begriffe (nur als Notlösung aus name_search_parts) und solche mit
+    Leerzeichen werden linear gesucht. Ergebnisse werden pro Name gemerkt.
+    """
+
+    def __init__(self, values, layout=None):
+        layout = layout or QuestLayout(values)
+        rows = list(layout.student_rows)
+        start, end = layout.name_span
+        texts = [_strip_class_tags(" ".join(str(x) for x in values[i][start:end]).lower()) for i in rows]
+        self._index(rows, texts)
+
+    @classmethod
+    def from_texts(cls, rows, texts):
+        """Index aus bereits aufbereiteten Zeilentexten (z.B. aus dem Offline-Stand)."""
+        index = cls.__new__(cls)
+        index._index(list(rows), list(texts))
+        return index
+
+    def _index(self, rows, texts):
+        self.rows = rows
+        self.texts = texts
+        self._tokens = {}
+        self._found = {}
+        for pos, text in enumerate(texts):
+            for token in set(text.split()):
+                self._tokens.setdefault(token, []).append(pos)
+        self._trigrams = {}
+        for token in self._tokens:
+            for i in range(len(token) - 2):
+                self._trigrams.setdefault(token[i:i + 3], set()).add(token)
+
+    def find(self, real_name):
+        """Alle passenden Questbuch-Zeilen (Index wie im Blatt, aufsteigend). Mehr als eine = mehrdeutig."""
+        found = self._found.get(real_name)
+        if found is None:
+            found = self._found[real_name] = self._match(name_search_parts(real_name))
+        return found
+
+    def _containing(self, part):
+        """Positionen aller Zeilen, in deren Text part (ohne Leerzeichen) vorkommt."""
+        if len(part) < 3:
+            candidates = self._tokens
+        else:
+            grams = [self._trigrams.get(part[i:i + 3]) for i in range(len(part) - 2)]
+            if any(g is None for g in grams):
+                return set()
+            candidates = min(grams, key=len)
+        found = set()
+        for token in candidates:
+            if part in token:
+                found.update(self._tokens[token])
+        return found
+
+    def _match(self, parts):
+        if any(not p or len(p.split()) != 1 for p in parts):
+            # Leerer Begriff oder mit Leerzeichen: nur über die ganzen Texte prüfbar
+            return [self.rows[pos] for pos, text in enumerate(self.texts) if all(p in text for p in parts)]
+        hits = None
+        for p in parts:
+            found = self._containing(p)
+            hits = found if hits is None else hits & found
+            if not hits:
+                return []
+        return [self.rows[pos] for pos in sorted(hits)]
+
+
+def _is_stop_column(name_clean):
+    """Ab dieser Spalte folgen keine Quests mehr (Summen, CP, Game Over)."""
+    if name_clean == "cp" or "gesamtsumme" in name_clean or "game-over?" in name_clean:
+        return True
+    return "game" in name_clean and "over" in name_clean
+
+
+# Spalten der Questbuch-Kopfzeile, die keine Quests sind (ganzer Name bzw. Namensteil)
+QUEST_SKIP_NAMES = frozenset(["quest", "quest ", "kachel", "code", "levelaufstieg?", "bezeichnung"])
+QUEST_SKIP_PARTS = ("questart", "summe", "total", "gold")
+
+
+def quest_columns(header_row):
+    """Wendet die Stop-/Filterregeln einmal auf die Kopfzeile an -> [(Spalte, Questname), ...].
+
+    Die XP eines Schülers zu einer Quest stehen jeweils eine Spalte rechts vom Questnamen.
+    """
+    columns = []
+    processed_cols = set()
+    for c in range(len(header_row)):
+        if c in processed_cols: continue
+
+        q_name = str(header_row[c])
+        q_name_clean = q_name.strip().lower()
+
+        # 1. STOP LOGIK
+        if _is_stop_column(q_name_clean):
+            break
+
+        # 2. FILTER LOGIK
+        if q_name == "nan" or not q_name.strip(): continue
+        if q_name_clean in QUEST_SKIP_NAMES: continue
+        if any(s in q_name_clean for s in QUEST_SKIP_PARTS): continue
+
+        columns.append((c, q_name))
+        processed_cols.add(c)
+        processed_cols.add(c + 1)
+    return columns
+
+
+def gold_columns(header_row):
+    """Spalten mit "gold" in der Kopfzeile (vor den Stop-Spalten) -> [Spalte, ...].
+
+    Anders als bei Quests steht das Gold eines Schülers direkt in dieser Spalte.
+    """
+    cols = []
+    for c, cell in enumerate(header_row):
+        name_clean = str(cell).strip().lower()
+        if _is_stop_column(name_clean):
+            break
+        if "gold" in name_clean:
+            cols.append(c)
+    return cols
+
+
+@lru_cache(maxsize=16)
+def _header_layout(header_row):
+    """Quest- und Gold-Spalten einer Kopfzeile (Tupel); gleiche Kopfzeile = Ergebnis aus dem Cache."""
+    return tuple(quest_columns(header_row)), tuple(gold_columns(header_row))
+
+
+class QuestLayout:
+    """Aufbau des Questbuchs, einmal pro Snapshot erkannt und geprüft.
+
+    quests: [(Spalte Questname, Spalte Schüler-XP, Questname)], gold_cols,
+    student_rows (Blattzeilen-Indizes) und name_span (Spalten A-D für die
+    Namenssuche). Die Stop-/Filterregeln laufen nur hier, und für eine
+    unveränderte Kopfzeile nur einmal pro Prozess. Wirft SchemaError, wenn
+    Kopf- oder Soll-XP-Zeile oder alle Quests fehlen.
+    """
+
+    name_span = (0, 4)
+
+    def __init__(self, values):
+        if len(values) <= QUEST_MASTER_XP_ROW:
+            raise SchemaError(
+                f"Questbuch: zu wenige Zeilen – Questnamen in Zeile {QUEST_HEADER_ROW + 1} "
+                f"und Soll-XP in Zeile {QUEST_MASTER_XP_ROW + 1} erwartet"
+            )
+        self.width = len(values[QUEST_HEADER_ROW])
+        columns, self.gold_cols = _header_layout(tuple(str(c) for c in values[QUEST_HEADER_ROW]))
+        if not columns:
+            raise SchemaError(f"Questbuch: keine Quest-Spalten in Zeile {QUEST_HEADER_ROW + 1} gefunden")
+        last_col, last_name = columns[-1]
+        if last_col + 1 >= self.width:
+            raise SchemaError(
+                f"Questbuch: zur Quest '{last_name}' fehlt die XP-Spalte {_column_label(last_col + 1)}"
+            )
+        self.quests = [(c, c + 1, name) for c, name in columns]
+        self.master_row = QUEST_MASTER_XP_ROW
+        self.student_rows = range(QUEST_FIRST_STUDENT_ROW, len(values))
+
+
+class QuestMatrix:
+    """Quest-Spalten, Soll-XP und XP-Matrix aller Schüler, einmal pro Questbuch-Snapshot aufgebaut.
+
+    student_xp[i, q] (int32) sind die eingetragenen XP von Schüler-Zeile
+    QUEST_FIRST_STUDENT_ROW + i für Quest q; eine Quest gilt als erledigt, wenn
+    dieser Wert > 0 ist. Das steht zusätzlich bitweise gepackt in done_bits
+    (8 Quests pro Byte, siehe completed_rows) und gezählt in done_count.
+    gold[i] ist die Summe der "Gold"-Spalten der Zeile.
+    Alle Spalten und Zeilen kommen aus dem QuestLayout.
+    """
+
+    def __init__(self, values, layout=None):
+        layout = layout or QuestLayout(values)
+        columns = [(name_col, name) for name_col, _, name in layout.quests]
+        xp_cols = [xp_col for _, xp_col, _ in layout.quests]
+        master_xp_row = values[layout.master_row]
+        master_xp = clean_number_series([master_xp_row[c] for c, _ in columns])
+
+        rows = values[layout.student_rows.start:layout.student_rows.stop]
+        block = np.array(rows, dtype=object).reshape(-1, layout.width)
+        student_xp = np.zeros((len(block), len(xp_cols)), dtype=np.int64)
+        if len(block):
+            cells = block[:, xp_cols]
+            student_xp[:] = clean_number_series(cells.ravel()).reshape(cells.shape)
+        gold = np.zeros(len(block), dtype=np.int64)
+        if len(block) and layout.gold_cols:
+            cells = block[:, list(layout.gold_cols)]
+            gold = clean_number_series(cells.ravel()).reshape(cells.shape).sum(axis=1)
+        self._set(columns, master_xp, student_xp, gold)
+
+    @classmethod
+    def from_arrays(cls, columns, master_xp, student_xp, gold=None):
+        """Matrix aus bereits geparsten Arrays (z.B. aus dem Offline-Stand)."""
+        matrix = cls.__new__(cls)
+        gold = np.zeros(len(student_xp), dtype=np.int32) if gold is None else gold
+        matrix._set(list(columns), master_xp, student_xp, gold)
+        return matrix
+
+    def _set(self, columns, master_xp, student_xp, gold):
+        self.columns = columns
+        self.names = [sys.intern(name) for _, name in columns]
+        self.master_xp = _int32(master_xp)
+        self.student_xp = _int32(student_xp)
+        self.gold = _int32(gold)
+        done = self.student_xp > 0
+        self.done_bits = np.packbits(done, axis=1)
+        self.done_count = done.sum(axis=1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def students(self):
+        """Anzahl der Schüler-Zeilen."""
+        return len(self.student_xp)
+
+    def completed_rows(self, rows):
+        """Erledigt-Matrix (bool, Zeilen x Quests) für die Positionen rows, entpackt aus done_bits."""
+        return np.unpackbits(self.done_bits[rows], axis=1, count=len(self)).view(bool)
+
+    def for_student(self, q_row_idx):
+        """(offene, erledigte) Quests einer Questbuch-Zeile als Listen von {"name", "xp", "completed"}."""
+        pos = q_row_idx - QUEST_FIRST_STUDENT_ROW
+        completed = self.completed_rows([pos])[0]
+        display_xp = np.where(completed, self.student_xp[pos], self.master_xp)
+        open_quests, completed_quests = [], []
+        for name, xp, done in zip(self.names, display_xp.tolist(), completed.tolist()):
+            quest_entry = {"name": name, "xp": xp, "completed": done}
+            (completed_quests if done else open_quests).append(quest_entry)
+        return open_quests, completed_quests
+
+
+def quest_rows(players, names, quests):
+    """Questbuch-Zeile pro Spieler des PlayerIndex (erster Treffer wie in der Einzelansicht).
+
+    -> (Position in der Quest-Matrix, Maske "Zeile gefunden"), beide in der Reihenfolge von players.
+    """
+    q_pos = np.array([(names.find(name) or [-1])[0] for name in players.names], dtype=np.intp)
+    q_pos -= QUEST_FIRST_STUDENT_ROW
+    has_row = (q_pos >= 0) & (q_pos < quests.students)
+    return q_pos, has_row
+
+
+class ClassSummary:
+    """Kennzahlen für die ganze Klasse aus einem Snapshot beider Blätter (für Rangliste/Lehrer-Ansicht).
+
+    Alles wird einmal beim Aufbau berechnet, auch pro Klasse; die Anzeige greift
+    nur noch auf fertige Tabellen zu.
+    """
+
+    ALL = "Alle"
+
+    def __init__(self, players, names, quests):
+        xp = players.xp.astype(np.int64)
+        level, progress, _ = levels.progress_batch(xp)
+
+        q_pos, has_row = quest_rows(players, names, quests)
+        done = np.zeros(len(players), dtype=np.int64)
+        done[has_row] = quests.done_count[q_pos[has_row]]
+
+        klasse = players.klasse
+        students = pd.DataFrame({
+            # Kein Gamertag: er ist das Login (und der Schlüssel der Shop-Wallet), die Rangliste sieht jeder
+            "Name": players.names,
+            "Klasse": klasse,
+            "Level": level,
+            "XP": xp,
+            "Fortschritt": progress,
+            "Erledigt": pd.array(np.where(has_row, done, 0), dtype="Int64"),
+            "Offen": pd.array(np.where(has_row, len(quests) - done, 0), dtype="Int64"),
+            "Game Over": players.is_go,
+        })
+        students.loc[~has_row, ["Erledigt", "Offen"]] = pd.NA
+        students = students.sort_values("XP", ascending=False, kind="stable").reset_index(drop=True)
+        students.insert(0, "Rang", np.arange(1, len(students) + 1))
+
+        self.classes = sorted(k for k in klasse.categories if k)
+        self.students = {self.ALL: students}
+        self.quest_stats = {self.ALL: self._quest_stats(quests, q_pos[has_row])}
+        class_arr = np.asarray(klasse)
+        for k in self.classes:
+            part = students[students["Klasse"] == k].reset_index(drop=True)
+            part["Rang"] = np.arange(1, len(part) + 1)
+            self.students[k] = part
+            self.quest_stats[k] = self._quest_stats(quests, q_pos[has_row & (class_arr == k)])
+
+    @staticmethod
+    def _quest_stats(quests, rows):
+        count = quests.completed_rows(rows).sum(axis=0)
+        return pd.DataFrame({
+            "Quest": quests.names,
+            "Soll-XP": quests.master_xp,
+            "Erledigt von": count,
+            "Quote %": 100.0 * count / len(rows) if len(rows) else np.zeros(len(quests)),
+        })
+
+    def students_for(self, klasse=ALL):
+        return self.students.get(klasse, self.students[self.ALL])
+
+    def quest_stats_for(self, klasse=ALL):
+        return self.quest_stats.get(klasse, self.quest_stats[self.ALL])
@@ -0,0 +1,605 @@
+"""Zugriffsschicht für die Google-Sheets-Daten (prozessweit, von allen Sessions geteilt)."""
+import collections
+import itertools
+import random
+import threading
+import time
+
+import gspread
+import requests
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+import perf
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Standard-Lebensdauer eines Snapshots in Sekunden
+DEFAULT_TTL = 60
+# Lese-Kontingent der Sheets-API pro Minute und Nutzer (Google-Standardwert)
+READ_QUOTA_PER_MINUTE = 60
+RETRY_STATUS = (429, 500, 502, 503, 504)
+OWN_REVISIONS_KEPT = 32  # gemerkte Änderungsstände eigener Schreibzugriffe
+
+_versions = itertools.count(1)
+_writes = itertools.count(1)
+
+
+def is_retryable(error):
+    """Vorübergehende Fehler: Kontingent überschritten (429), Serverfehler (5xx), Netzwerkprobleme."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code in RETRY_STATUS
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def is_quota_error(error):
+    return isinstance(error, gspread.exceptions.APIError) and error.code == 429
+
+
+class RateLimiter:
+    """Schützt das API-Kontingent: Minutenbudget, Zusammenlegen gleicher Aufrufe, Retry mit Backoff.
+
+    Ist das Budget der letzten 60 Sekunden verbraucht, wartet ein Aufruf, bis
+    wieder Platz ist. 429/5xx-Antworten werden mit exponentiellem Backoff
+    (voller Jitter) wiederholt. Gleichzeitige Aufrufe mit gleichem Schlüssel
+    teilen sich eine Anfrage.
+    """
+
+    def __init__(self, per_minute=READ_QUOTA_PER_MINUTE, retries=3, base_delay=0.5, max_delay=8.0):
+        self.per_minute = per_minute
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._calls = collections.deque()
+        self._flights = {}
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "throttled_s": 0.0}
+
+    def remaining(self):
+        """Noch freie Aufrufe im aktuellen Minutenfenster."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return self.per_minute - len(self._calls)
+
+    def _expire(self, now):
+        while self._calls and now - self._calls[0] >= 60:
+            self._calls.popleft()
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if len(self._calls) < self.per_minute:
+                    self._calls.append(now)
+                    self.stats["calls"] += 1
+                    return
+                wait = 60 - (now - self._calls[0])
+                self.stats["throttled_s"] += wait
+            time.sleep(wait)
+
+    def _with_retry(self, fn, retry):
+        for attempt in range(self.retries + 1):
+            self._acquire()
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.retries or not retry(e):
+                    raise
+                self.stats["retries"] += 1
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def call(self, key, fn, retry=is_retryable):
+        """Führt fn() unter Kontingent und Retry aus; läuft key schon, wird dessen Ergebnis geteilt.
+
+        retry entscheidet, welche Fehler wiederholt werden; Schreibzugriffe, die
+        nicht doppelt ausgeführt werden dürfen, übergeben is_quota_error.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._with_retry(fn, retry)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+class SheetsClient:
+    """Verbindung zu einem Spreadsheet, einmal pro Prozess aufgebaut und von allen Sessions geteilt.
+
+    Credentials, gspread-Client und Spreadsheet-Handle werden nur beim ersten
+    Zugriff erzeugt; das Access-Token wird nur erneuert, wenn es abgelaufen ist.
+    """
+
+    def __init__(self, service_account_info, spreadsheet_id, scopes=SCOPES, limiter=None):
+        self.spreadsheet_id = spreadsheet_id
+        self.scopes = list(scopes)
+        self.limiter = limiter or RateLimiter()
+        self._info = dict(service_account_info)
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        # Änderungsstand nach eigenem Schreibzugriff -> Stand davor (eigene Käufe sind keine Datenänderung)
+        self._own_revisions = {}
+        # Messwerte für den Debug-Modus
+        self.connect_seconds = 0.0
+        self.refresh_seconds = 0.0
+        self.token_refreshes = 0
+        self.reuses = 0
+
+    @classmethod
+    def for_spreadsheet(cls, spreadsheet, limiter=None):
+        """Client um ein bereits geöffnetes Spreadsheet (z.B. fake_sheets) – ohne Credentials."""
+        client = cls({}, spreadsheet.id, limiter=limiter)
+        client._spreadsheet = spreadsheet
+        return client
+
+    def spreadsheet(self):
+        """Liefert das (wiederverwendete) gspread-Spreadsheet."""
+        with self._lock:
+            if self._spreadsheet is None:
+                start = time.perf_counter()
+                with perf.span("auth"):
+                    credentials = Credentials.from_service_account_info(self._info, scopes=self.scopes)
+                    gc = gspread.authorize(credentials)
+                    self._spreadsheet = self.limiter.call(
+                        ("open", self.spreadsheet_id), lambda: gc.open_by_key(self.spreadsheet_id)
+                    )
+                self._credentials = credentials
+                self.connect_seconds = time.perf_counter() - start
+            else:
+                self.reuses += 1
+                self._ensure_token()
+            return self._spreadsheet
+
+    def _ensure_token(self):
+        if self._credentials is None or self._credentials.valid:
+            return
+        start = time.perf_counter()
+        with perf.span("auth: token"):
+            self._credentials.refresh(Request())
+        self.refresh_seconds += time.perf_counter() - start
+        self.token_refreshes += 1
+
+    def revision(self):
+        """Änderungsstand des Spreadsheets (Drive modifiedTime) – ein kleiner Metadaten-Request.
+
+        Stände, die nur durch eigene Schreibzugriffe (_own_write) entstanden sind,
+        werden auf den Stand davor abgebildet, damit sie kein Neuladen auslösen.
+        """
+        spreadsheet = self.spreadsheet()
+        with perf.span("revision check"):
+            raw = self.limiter.call(("modifiedTime", self.spreadsheet_id), spreadsheet.get_lastUpdateTime)
+        return self._own_revisions.get(raw, raw)
+
+    def _own_write(self, write):
+        """Führt write() aus und merkt sich den danach gemeldeten Änderungsstand als "unverändert".
+
+        Der Stand wird direkt nach dem Schreiben mit eigenem Schlüssel gelesen (kein
+        geteiltes Ergebnis einer älteren Abfrage); eine fremde Änderung genau
+        zwischen Schreiben und Lesen würde so mit übernommen – das Fenster ist ein Request.
+        """
+        try:
+            before = self.revision()
+        except Exception:
+            return write()  # Stand unbekannt: schreiben, der nächste Abgleich lädt dann neu
+        result = write()
+        try:
+            after = self.limiter.call(
+                ("modifiedTime", self.spreadsheet_id, "own-write", next(_writes)),
+                self.spreadsheet().get_lastUpdateTime
+            )
+        except Exception:
+            return result  # ohne Stand danach lädt der nächste Abgleich eben neu
+        if after != before:
+            with self._lock:
+                if len(self._own_revisions) >= OWN_REVISIONS_KEPT:
+                    self._own_revisions.pop(next(iter(self._own_revisions)))
+                self._own_revisions[after] = before
+        return result
+
+    def worksheet(self, title, header=None):
+        """Arbeitsblatt title (gecacht); fehlt es und ist header angegeben, wird es damit angelegt."""
+        ws = self._worksheets.get(title)
+        if ws is not None:
+            return ws
+        spreadsheet = self.spreadsheet()
+        try:
+            ws = self.limiter.call(("worksheet", self.spreadsheet_id, title), lambda: spreadsheet.worksheet(title))
+        except gspread.exceptions.WorksheetNotFound:
+            if header is None:
+                raise
+            def create():
+                ws = self.limiter.call(
+                    ("add_worksheet", self.spreadsheet_id, title),
+                    lambda: spreadsheet.add_worksheet(title, rows=1, cols=len(header)),
+                    retry=is_quota_error
+                )
+                self.limiter.call(
+                    ("append", title, next(_writes)), lambda: ws.append_rows([header]), retry=is_quota_error
+                )
+                return ws
+            ws = self._own_write(create)
+        self._worksheets[title] = ws
+        return ws
+
+    def append_rows(self, title, rows, header=None):
+        """Hängt rows mit einem einzigen API-Aufruf an das Blatt title an.
+
+        Nur 429 wird wiederholt: bei anderen Fehlern ist offen, ob die Zeilen
+        angekommen sind – das muss der Aufrufer (z.B. über Schlüssel) klären.
+        """
+        ws = self.worksheet(title, header)
+        return self._own_write(lambda: self.limiter.call(
+            ("append", title, next(_writes)),
+            lambda: ws.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS"),
+            retry=is_quota_error
+        ))
+
+    def column_values(self, title, col):
+        """Werte einer Spalte (1-basiert); [] wenn es das Blatt noch nicht gibt."""
+        try:
+            ws = self.worksheet(title)
+        except gspread.exceptions.WorksheetNotFound:
+            return []
+        return self.limiter.call(("col", self.spreadsheet_id, title, col), lambda: ws.col_values(col))
+
+    def stats(self):
+        """Zeitmessung: einmaliger Verbindungsaufbau vs. Wiederverwendungen."""
+        return {
+            "connect_ms": round(self.connect_seconds * 1000, 1),
+            "reuses": self.reuses,
+            "saved_ms": round(self.connect_seconds * self.reuses * 1000, 1),
+            "token_refreshes": self.token_refreshes,
+            "refresh_ms": round(self.refresh_seconds * 1000, 1),
+        }
+
+
+class Snapshot:
+    """Stand eines Arbeitsblatts: Rohwerte wie von get_all_values() plus Ladezeitpunkt.
+
+    Die Rohwerte werden von allen Sessions geteilt und dürfen nicht verändert werden.
+    Snapshots aus dem Offline-Stand haben keine Rohwerte (values=None), nur die
+    bereits ausgewerteten Ableitungen (derived).
+    """
+
+    def __init__(self, values, loaded_at=None, revision=None, derived=None):
+        self.values = values
+        self.version = next(_versions)
+        self.loaded_at = time.time() if loaded_at is None else loaded_at
+        # Stand laut Drive-API (modifiedTime) und wann er zuletzt bestätigt wurde
+        self.revision = revision
+        self.checked_at = self.loaded_at
+        # Gesetzt, solange der Snapshot nur als Ersatz dient, weil das Nachladen scheitert
+        self.stale_since = None
+        # Aus dem Offline-Stand und noch nicht von Google Sheets bestätigt
+        self.offline = False
+        self._derived = dict(derived or {})
+        self._derive_lock = threading.RLock()
+
+    def release_values(self):
+        """Gibt die Rohwerte frei, sobald alle benötigten Ableitungen gebaut sind (wie beim Offline-Stand)."""
+        with self._derive_lock:
+            self.values = None
+
+    def age(self):
+        """Sekunden seit dem Laden bzw. der letzten Bestätigung, dass sich nichts geändert hat."""
+        return time.time() - self.checked_at
+
+    def derive(self, name, builder):
+        """Einmal pro Snapshot berechnete Ableitung (z.B. Index), builder(values) wird gecacht."""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._derive_lock:
+            if name not in self._derived:
+                with perf.span(f"derive: {name if isinstance(name, str) else name[0]}"):
+                    self._derived[name] = builder(self.values)
+            return self._derived[name]
+
+
+class _Flight:
+    """Ein laufender Ladevorgang, auf den weitere Sessions warten können."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SnapshotCache:
+    """TTL-begrenzter Cache für Arbeitsblätter, Schlüssel: (Spreadsheet-ID, Blattname).
+
+    Gleichzeitige Anfragen nach demselben Blatt warten auf einen einzigen
+    Ladevorgang (Single-Flight), statt jeweils selbst die API aufzurufen.
+    Mit einer revision-Funktion wird nach Ablauf der TTL zuerst der Änderungsstand
+    geprüft; ist er unverändert, bleibt der Snapshot (samt Indizes) gültig.
+    Läuft ein Refresher, werden vorhandene Snapshots auch nach Ablauf der TTL
+    ausgeliefert – aktualisiert wird dann nur im Hintergrund.
+    Scheitert das Nachladen, wird der letzte gute Snapshot weiter ausgeliefert
+    (stale_since gesetzt) und erst nach einer weiteren TTL erneut versucht.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.keep_stale = False
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+        self.stats = {"hits": 0, "unchanged": 0, "fetches": 0, "fallbacks": 0}
+        self.last_error = None
+
+    def _is_fresh(self, snap):
+        return snap is not None and (self.keep_stale or snap.age() < self.ttl)
+
+    def get_many(self, spreadsheet_id, titles, fetch, revision=None, prepare=None, force=False):
+        """Liefert {Blattname: Snapshot}; alle fehlenden Blätter werden mit einem fetch(titles) geladen.
+
+        fetch bekommt die Liste der nachzuladenden Blätter und liefert {Blattname: Rohwerte}.
+        revision() (optional) liefert den aktuellen Änderungsstand des Spreadsheets.
+        prepare(snaps) (optional) wird mit allen angefragten Snapshots aufgerufen, bevor
+        neu geladene im Cache sichtbar werden (z.B. um Indizes vorab zu bauen).
+        force=True prüft bzw. lädt auch noch gültige Snapshots neu.
+        """
+        result = {}
+        waiting = {}
+        missing = []
+        flight = None
+        with self._lock:
+            for title in titles:
+                key = (spreadsheet_id, title)
+                snap = self._entries.get(key)
+                if not force and self._is_fresh(snap):
+                    result[title] = snap
+                    self.stats["hits"] += 1
+                elif key in self._flights:
+                    waiting[title] = self._flights[key]
+                else:
+                    missing.append(title)
+            if missing:
+                flight = _Flight()
+                for title in missing:
+                    self._flights[(spreadsheet_id, title)] = flight
+
+        if missing:
+            try:
+                flight.result = self._load_or_fallback(spreadsheet_id, missing, fetch, revision, prepare, result)
+                result.update(flight.result)
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for title in missing:
+                        self._flights.pop((spreadsheet_id, title), None)
+                flight.done.set()
+
+        for title, other in waiting.items():
+            other.done.wait()
+            if other.error is not None:
+                raise other.error
+            result[title] = other.result[title]
+        return result
+
+    def _load_or_fallback(self, spreadsheet_id, titles, fetch, revision, prepare, current):
+        try:
+            snaps = self._load(spreadsheet_id, titles, fetch, revision, prepare, current)
+        except Exception as e:
+            # Letzten guten Stand weiter ausliefern, wenn es für alle Blätter einen gibt
+            now = time.time()
+            with self._lock:
+                old = {title: self._entries.get((spreadsheet_id, title)) for title in titles}
+                if any(snap is None for snap in old.values()):
+                    raise
+                for snap in old.values():
+                    snap.stale_since = snap.stale_since or now
+                    snap.checked_at = now  # nächster Versuch erst nach einer weiteren TTL
+                self.stats["fallbacks"] += 1
+                self.last_error = e
+            return old
+        for snap in snaps.values():
+            snap.stale_since = None
+            snap.offline = False
+        self.last_error = None
+        return snaps
+
+    def _load(self, spreadsheet_id, titles, fetch, revision, prepare, current):
+        rev = None
+        if revision is not None:
+            try:
+                rev = revision()
+            except Exception:
+                rev = None  # ohne Änderungsstand einfach komplett laden
+
+        snaps = {}
+        with self._lock:
+            for title in titles:
+                old = self._entries.get((spreadsheet_id, title))
+                if rev is not None and old is not None and old.revision == rev:
+                    old.checked_at = time.time()
+                    snaps[title] = old
+            self.stats["unchanged"] += len(snaps)
+
+        to_fetch = [title for title in titles if title not in snaps]
+        if to_fetch:
+            values = fetch(to_fetch)
+            fetched = {title: Snapshot(values[title], revision=rev) for title in to_fetch}
+            if prepare is not None:
+                prepare({**current, **snaps, **fetched})
+            with self._lock:
+                for title, snap in fetched.items():
+                    self._entries[(spreadsheet_id, title)] = snap
+                self.stats["fetches"] += 1
+            snaps.update(fetched)
+        return snaps
+
+    def seed(self, spreadsheet_id, snaps):
+        """Übernimmt vorhandene Snapshots (z.B. den Offline-Stand), solange noch nichts geladen ist."""
+        with self._lock:
+            for title, snap in snaps.items():
+                self._entries.setdefault((spreadsheet_id, title), snap)
+
+
+class Refresher:
+    """Optionaler Hintergrund-Thread, der die Snapshots alle interval Sekunden aktualisiert.
+
+    Neue Snapshots werden (inkl. prepare, also Indizes) fertig aufgebaut und erst
+    dann im Cache ausgetauscht; Reruns im Vordergrund warten so nie auf das Netz.
+    """
+
+    def __init__(self, cache, spreadsheet_id, titles, fetch, revision=None, prepare=None, interval=30):
+        self.cache = cache
+        self.spreadsheet_id = spreadsheet_id
+        self.titles = list(titles)
+        self.fetch = fetch
+        self.revision = revision
+        self.prepare = prepare
+        self.interval = interval
+        self.last_refresh = None
+        self.last_duration = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.cache.keep_stale = True
+            self._thread = threading.Thread(target=self._run, name="sheets-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.cache.keep_stale = False
+
+    def _run(self):
+        while True:
+            self.refresh_now()
+            if self._stop.wait(self.interval):
+                return
+
+    def refresh_now(self):
+        start = time.perf_counter()
+        try:
+            self.cache.get_many(
+                self.spreadsheet_id, self.titles, self.fetch,
+                revision=self.revision, prepare=self.prepare, force=True
+            )
+            self.last_error = self.cache.last_error
+        except Exception as e:
+            self.last_error = e
+        self.last_duration = time.perf_counter() - start
+        self.last_refresh = time.time()
+
+
+def _col_letter(idx):
+    """0-basierter Spaltenindex -> A1-Spaltenbuchstaben (0 -> A, 26 -> AA)."""
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rest = divmod(idx - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def _quote_title(title):
+    return "'" + title.replace("'", "''") + "'"
+
+
+def _assemble(parts):
+    """Setzt Teilbereiche [(Startspalte, Zeilen), ...] zu einem rechteckigen Raster zusammen.
+
+    Nicht geladene Spalten bleiben leer (""), damit Spaltenindizes wie bei
+    get_all_values() erhalten bleiben.
+    """
+    height = max((len(rows) for _, rows in parts), default=0)
+    width = max((start + len(row) for start, rows in parts for row in rows), default=0)
+    grid = [[""] * width for _ in range(height)]
+    for start, rows in parts:
+        for r, row in enumerate(rows):
+            grid[r][start:start + len(row)] = row
+    return grid
+
+
+class BatchLoader:
+    """Lädt mehrere Arbeitsblätter mit einem einzigen values:batchGet-Aufruf.
+
+    Für Blätter mit bekannter Spaltenfunktion (column_spans: {Blattname: f(values)})
+    werden nach dem ersten vollständigen Laden nur noch die benötigten Spalten
+    angefordert. f liefert [(start, ende), ...] (0-basiert, ende exklusiv) oder
+    None, wenn das Layout nicht erkannt wird. Ändert sich das Layout, wird das
+    Blatt wieder komplett geladen. Mit limiter laufen die Aufrufe über den RateLimiter.
+    """
+
+    def __init__(self, column_spans=None, limiter=None):
+        self._span_funcs = dict(column_spans or {})
+        self.limiter = limiter
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def _ranges_for(self, title):
+        with self._lock:
+            spans = self._spans.get(title)
+        if not spans:
+            return [(0, _quote_title(title))]
+        return [
+            (start, f"{_quote_title(title)}!{_col_letter(start)}:{_col_letter(end - 1)}")
+            for start, end in spans
+        ]
+
+    def fetch(self, spreadsheet, titles):
+        """Liefert {Blattname: Rohwerte} für alle titles (ein HTTP-Aufruf im Normalfall)."""
+        plan = [(title, start, rng) for title in titles for start, rng in self._ranges_for(title)]
+        ranges = [rng for _, _, rng in plan]
+        with perf.span(f"fetch: {', '.join(titles)}"):
+            if self.limiter is None:
+                response = spreadsheet.values_batch_get(ranges)
+            else:
+                response = self.limiter.call(
+                    ("batchGet", spreadsheet.id, tuple(ranges)), lambda: spreadsheet.values_batch_get(ranges)
+                )
+        parts = {title: [] for title in titles}
+        for (title, start, _), value_range in zip(plan, response.get("valueRanges", [])):
+            parts[title].append((start, value_range.get("values", [])))
+
+        result = {}
+        relayout = []
+        for title in titles:
+            with perf.span(f"assemble: {title}"):
+                values = _assemble(parts[title])
+            func = self._span_funcs.get(title)
+            if func is not None:
+                spans = func(values)
+                with self._lock:
+                    previous = self._spans.get(title)
+                    self._spans[title] = spans
+                if previous and spans != previous:
+                    # Layout hat sich geändert -> Blatt komplett neu laden
+                    with self._lock:
+                        self._spans.pop(title, None)
+                    relayout.append(title)
+                    continue
+            result[title] = values
+        if relayout:
+            result.update(self.fetch(spreadsheet, relayout))
+        return result
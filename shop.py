@@ -2,79 +2,311 @@ import streamlit as st
 import json
 import os
 import io
+import itertools
+import logging
+import threading
+import time
+from functools import lru_cache
 from PIL import Image, ImageDraw
 
+import perf
+import store
 
-def load_items(path='data/shop_items.json'):
-    if os.path.exists(path):
+
+# Fallback demo items (gleiches Format wie data/shop_items.json)
+DEFAULT_ITEMS = [
+    {"id": "hat", "name": "Roter Hut", "price": 30, "color": "#c0392b", "layer": "hat", "z": 30,
+     "shapes": [{"type": "rectangle", "xy": [28, 0, 100, 28]}]},
+    {"id": "cape", "name": "Blauer Umhang", "price": 50, "color": "#2980b9", "layer": "cape", "z": 10,
+     "shapes": [{"type": "polygon", "xy": [[40, 110], [88, 110], [128, 80], [0, 80]]}]},
+    {"id": "sword", "name": "Bronzeschwert", "price": 70, "color": "#b8860b", "layer": "sword", "z": 20,
+     "shapes": [{"type": "rectangle", "xy": [88, 40, 104, 100]}]}
+]
+
+
+CATALOG_PATH = 'data/shop_items.json'
+CATALOG_CHECK_INTERVAL = 5.0  # Sekunden, in denen die Katalog-Datei nicht erneut geprüft wird
+SHAPE_TYPES = ('rectangle', 'ellipse', 'polygon')
+
+log = logging.getLogger(__name__)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_point(value):
+    return isinstance(value, list) and len(value) == 2 and all(_is_number(v) for v in value)
+
+
+def _valid_xy(shape_type, xy):
+    """rectangle/ellipse: [x0, y0, x1, y1] oder [[x0, y0], [x1, y1]]; polygon: mindestens 3 Punkte [x, y]."""
+    if shape_type == 'polygon':
+        return len(xy) >= 3 and all(_is_point(pt) for pt in xy)
+    return (len(xy) == 4 and all(_is_number(v) for v in xy)) or (len(xy) == 2 and all(_is_point(pt) for pt in xy))
+
+
+def validate_items(items):
+    """Prüft den Katalog einmal beim Laden; wirft ValueError mit der ersten Abweichung.
+
+    Jedes Item wird dabei einmal probeweise gezeichnet, damit fehlende Sprite-Dateien
+    oder ungültige Farben schon hier auffallen und nicht erst beim Avatar.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("Katalog muss eine nicht-leere Liste sein")
+    seen = set()
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {pos}: kein Objekt")
+        iid = item.get('id')
+        if not isinstance(iid, str) or not iid:
+            raise ValueError(f"Item {pos}: 'id' fehlt")
+        if iid in seen:
+            raise ValueError(f"Item {iid}: doppelte id")
+        seen.add(iid)
+        if not isinstance(item.get('name'), str):
+            raise ValueError(f"Item {iid}: 'name' fehlt")
+        price = item.get('price')
+        if not isinstance(price, int) or isinstance(price, bool) or price < 0:
+            raise ValueError(f"Item {iid}: 'price' muss eine ganze Zahl >= 0 sein")
+        if not isinstance(item.get('z', DEFAULT_Z), (int, float)):
+            raise ValueError(f"Item {iid}: 'z' muss eine Zahl sein")
+        shapes = item.get('shapes', [])
+        if not isinstance(shapes, list):
+            raise ValueError(f"Item {iid}: 'shapes' muss eine Liste sein")
+        for shape in shapes:
+            if not isinstance(shape, dict) or shape.get('type') not in SHAPE_TYPES:
+                raise ValueError(f"Item {iid}: unbekannte Form {shape!r}")
+            if not isinstance(shape.get('xy'), list):
+                raise ValueError(f"Item {iid}: Form ohne 'xy'")
+            if not _valid_xy(shape['type'], shape['xy']):
+                raise ValueError(f"Item {iid}: 'xy' passt nicht zu {shape['type']}: {shape['xy']!r}")
+        if 'sprite' in item and not isinstance(item['sprite'], str):
+            raise ValueError(f"Item {iid}: 'sprite' muss ein Dateipfad sein")
+        if 'offset' in item and not _is_point(item['offset']):
+            raise ValueError(f"Item {iid}: 'offset' muss [x, y] sein")
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    # Fallback demo items
-    return [
-        {"id": "hat", "name": "Roter Hut", "price": 30, "color": "#c0392b", "layer": "hat"},
-        {"id": "cape", "name": "Blauer Umhang", "price": 50, "color": "#2980b9", "layer": "cape"},
-        {"id": "sword", "name": "Bronzeschwert", "price": 70, "color": "#b8860b", "layer": "sword"}
-    ]
-
-
-def compose_avatar(inventory):
-    size = (128, 128)
-    img = Image.new('RGBA', size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
+            _render_item(item)
+        except (OSError, ValueError, TypeError) as e:
+            raise ValueError(f"Item {iid}: lässt sich nicht zeichnen ({e})") from e
+    return items
+
+
+class Catalog:
+    """Geprüfter Item-Katalog mit id-Index; version ist pro Prozess eindeutig (Cache-Schlüssel)."""
+
+    _versions = itertools.count(1)
+
+    def __init__(self, items, mtime=None, error=None):
+        self.items = items
+        self.by_id = {item['id']: item for item in items}
+        self.mtime = mtime
+        self.error = error
+        self.version = next(self._versions)
+
+    def __contains__(self, iid):
+        return iid in self.by_id
+
+    def __len__(self):
+        return len(self.items)
+
+
+_catalogs = {}  # Pfad -> (Catalog, Zeitpunkt der letzten Prüfung)
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(path=CATALOG_PATH):
+    """Katalog aus path, pro Prozess gecacht.
+
+    Die Datei wird höchstens alle CATALOG_CHECK_INTERVAL Sekunden per stat geprüft
+    und nur neu gelesen, wenn sich ihre mtime geändert hat. Ist sie fehlerhaft,
+    bleibt der bisherige Katalog (bzw. DEFAULT_ITEMS) aktiv, error beschreibt den Fehler.
+    """
+    now = time.monotonic()
+    cached = _catalogs.get(path)
+    if cached and now - cached[1] < CATALOG_CHECK_INTERVAL:
+        return cached[0]
+    with _catalog_lock:
+        cached = _catalogs.get(path)
+        if cached and now - cached[1] < CATALOG_CHECK_INTERVAL:
+            return cached[0]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        current = cached[0] if cached else None
+        if current is None or current.mtime != mtime:
+            current = _read_catalog(path, mtime, current)
+        _catalogs[path] = (current, now)
+        return current
+
+
+def _read_catalog(path, mtime, previous):
+    if mtime is None:
+        return Catalog(DEFAULT_ITEMS)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return Catalog(validate_items(json.load(f)), mtime)
+    except (OSError, ValueError) as e:
+        log.warning("Shop-Katalog %s ungültig: %s", path, e)
+        fallback = previous.items if previous and previous.error is None else DEFAULT_ITEMS
+        return Catalog(fallback, mtime, error=str(e))
 
+
+def load_items(path=CATALOG_PATH):
+    return get_catalog(path).items
+
+
+AVATAR_SIZE = (128, 128)
+AVATAR_CACHE_SIZE = 256  # Anzahl gecachter PNGs (verschiedene Inventare)
+ATLAS_WIDTH = 1024  # Breite des Sprite-Atlas in Pixeln
+DEFAULT_Z = 50  # z-Index für Items ohne Angabe (über den Standard-Items)
+
+
+@lru_cache(maxsize=1)
+def _base_sprite():
+    img = Image.new('RGBA', AVATAR_SIZE, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
     # Base face
     draw.ellipse((32, 16, 96, 80), fill=(255, 224, 189, 255))
     # Body
     draw.rectangle((44, 76, 84, 110), fill=(80, 40, 20, 255))
+    return img
 
-    # Simple layer rendering based on item id
-    for it in inventory:
-        iid = it.get('id')
-        color = it.get('color', '#000000')
-        if iid == 'hat':
-            draw.rectangle((28, 0, 100, 28), fill=color)
-        elif iid == 'cape':
-            draw.polygon([(40, 110), (88, 110), (128, 80), (0, 80)], fill=color)
-        elif iid == 'sword':
-            draw.rectangle((88, 40, 104, 100), fill=color)
 
+def _render_item(item):
+    """Ein Item als RGBA-Ebene in Avatar-Größe: optionale Sprite-Datei + Formen aus dem Katalog.
+
+    Formen: {"type": "rectangle" | "ellipse" | "polygon", "xy": [...], "color": optional}.
+    """
+    img = Image.new('RGBA', AVATAR_SIZE, (0, 0, 0, 0))
+    if item.get('sprite'):
+        with Image.open(item['sprite']) as sprite:
+            img.alpha_composite(sprite.convert('RGBA'), dest=tuple(item.get('offset', (0, 0))))
+    draw = ImageDraw.Draw(img)
+    for shape in item.get('shapes', []):
+        fill = shape.get('color', item.get('color', '#000000'))
+        if shape['type'] == 'rectangle':
+            draw.rectangle(tuple(shape['xy']), fill=fill)
+        elif shape['type'] == 'ellipse':
+            draw.ellipse(tuple(shape['xy']), fill=fill)
+        elif shape['type'] == 'polygon':
+            draw.polygon([tuple(pt) for pt in shape['xy']], fill=fill)
     return img
 
 
-def show_shop(player_tag, stats):
-    st.sidebar.info(f"Shop geöffnet für: {player_tag}")
+class SpriteAtlas:
+    """Alle Item-Sprites des Katalogs in einem Bild, jeweils auf ihre Bounding-Box zugeschnitten.
+
+    entries: id -> (Ausschnitt im Atlas, Zielposition im Avatar, z-Index).
+    Gepackt wird in Regalen (Zeilen) nach Höhe sortiert.
+    """
+
+    def __init__(self, items):
+        crops = []
+        for item in items:
+            try:
+                sprite = _render_item(item)
+            except (OSError, ValueError, TypeError) as e:
+                # z.B. Sprite-Datei nach dem Laden gelöscht: nur dieses Item fehlt im Avatar
+                log.warning("Shop-Item %s lässt sich nicht zeichnen: %s", item['id'], e)
+                continue
+            bbox = sprite.getbbox()
+            if bbox is None:
+                continue
+            crops.append((item['id'], sprite.crop(bbox), bbox[:2], item.get('z', DEFAULT_Z)))
+
+        placed = []
+        x = y = shelf_h = 0
+        for iid, crop, dest, z in sorted(crops, key=lambda c: -c[1].height):
+            w, h = crop.size
+            if x + w > ATLAS_WIDTH and x > 0:
+                x, y, shelf_h = 0, y + shelf_h, 0
+            placed.append((iid, crop, (x, y), dest, z))
+            x += w
+            shelf_h = max(shelf_h, h)
+
+        self.image = Image.new('RGBA', (ATLAS_WIDTH, max(y + shelf_h, 1)), (0, 0, 0, 0))
+        self.entries = {}
+        for iid, crop, (px, py), dest, z in placed:
+            self.image.paste(crop, (px, py))
+            self.entries[iid] = ((px, py, px + crop.width, py + crop.height), dest, z)
+
+    def render(self, ids):
+        """Avatar mit den Items ids, nach z-Index aus dem Atlas geblittet."""
+        img = _base_sprite().copy()
+        for iid in sorted((i for i in ids if i in self.entries), key=lambda i: (self.entries[i][2], i)):
+            box, dest, _ = self.entries[iid]
+            img.alpha_composite(self.image, dest=dest, source=box)
+        return img
+
+
+@lru_cache(maxsize=2)
+def _atlas(catalog):
+    return SpriteAtlas(catalog.items)
+
+
+def _inventory_ids(inventory):
+    return tuple(sorted(inventory))
+
+
+def compose_avatar(inventory, catalog=None):
+    """Avatar-Bild für eine Sammlung von Item-ids."""
+    catalog = catalog or get_catalog()
+    return _atlas(catalog).render(_inventory_ids(inventory))
+
+
+@lru_cache(maxsize=AVATAR_CACHE_SIZE)
+def _avatar_png(catalog, ids):
+    with perf.span("avatar: render"):
+        buf = io.BytesIO()
+        _atlas(catalog).render(ids).save(buf, format='PNG')
+        return buf.getvalue()
+
+
+def avatar_png(inventory, catalog=None):
+    """Fertiges Avatar-PNG (bytes); gleiche Inventare werden pro Katalog-Version nur einmal gerendert."""
+    return _avatar_png(catalog or get_catalog(), _inventory_ids(inventory))
+
+
+LEDGER_LABELS = {"xp": "XP", "quests": "Erledigte Quests", "gold": "Gold aus dem Questbuch", "start": "Startguthaben"}
+
 
-    if 'gold' not in st.session_state:
-        st.session_state['gold'] = 100
-    if 'inventory' not in st.session_state:
-        st.session_state['inventory'] = []
+def show_shop(player_tag, wallets):
+    """Shop-Tab; wallets ist der ShopStore mit Gold und Inventar aller Spieler.
 
-    items = load_items()
+    Läuft in app.py als Fragment: schreibt nur in den eigenen Bereich (nicht in die Sidebar).
+    """
+    catalog = get_catalog()
+    gold, inventory = wallets.wallet(player_tag)
 
     st.header("🛒 Shop (Demo)")
-    st.write(f"Gold: {st.session_state['gold']}")
+    if catalog.error:
+        st.caption(f"⚠️ Shop-Katalog fehlerhaft, alter Stand aktiv: {catalog.error}")
+    gold_info = st.empty()
 
     cols = st.columns(3)
-    for idx, item in enumerate(items):
+    for idx, item in enumerate(catalog.items):
         with cols[idx % 3]:
             st.markdown(f"**{item['name']}**\nPreis: {item['price']} Gold")
             if st.button(f"Kaufen: {item['name']}", key=f"buy_{item['id']}"):
-                if st.session_state['gold'] >= item['price']:
-                    st.session_state['gold'] -= item['price']
-                    if not any(i.get('id') == item['id'] for i in st.session_state['inventory']):
-                        st.session_state['inventory'].append(item)
-                        st.success(f"{item['name']} gekauft!")
-                    else:
-                        st.info("Bereits im Inventar.")
+                result = wallets.buy(player_tag, item)
+                if result == store.BOUGHT:
+                    gold, inventory = wallets.wallet(player_tag)
+                    st.success(f"{item['name']} gekauft!")
+                elif result == store.OWNED:
+                    st.info("Bereits im Inventar.")
                 else:
                     st.error("Nicht genug Gold.")
 
+    gold_info.write(f"Gold: {gold}")
+    with st.expander("Gold-Verlauf"):
+        for when, source, amount in wallets.ledger(player_tag):
+            label = LEDGER_LABELS.get(source)
+            if label is None:
+                # Käufe: "kauf:<id>"; Items, die nicht mehr im Katalog sind, mit ihrer id
+                iid = source.split(':', 1)[-1]
+                label = f"Kauf: {catalog.by_id.get(iid, {}).get('name', iid)}"
+            st.write(f"{time.strftime('%d.%m.%Y %H:%M', time.localtime(when))} – {label}: {amount:+d}")
     st.subheader("Avatar Vorschau")
-    avatar = compose_avatar(st.session_state['inventory'])
-    buf = io.BytesIO()
-    avatar.save(buf, format='PNG')
-    buf.seek(0)
-    st.image(buf)
+    st.image(avatar_png(inventory, catalog))
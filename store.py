@@ -0,0 +1,328 @@
+"""Gold und Inventar der Spieler in einer lokalen SQLite-Datenbank (statt st.session_state).
+
+Schlüssel ist der normalisierte Gamertag. Die Datenbank läuft im WAL-Modus,
+damit viele Sessions gleichzeitig lesen können, während ein Kauf schreibt;
+jeder Kauf (Guthaben prüfen, abbuchen, Item eintragen) ist eine Transaktion.
+
+Jeder Kauf landet in derselben Transaktion auch in der Outbox; PurchaseSync
+schreibt sie im Hintergrund gesammelt ins Spreadsheet zurück.
+
+Gold wird verdient (XP, erledigte Quests, "Gold"-Spalten im Questbuch) und
+ausgegeben; jede Bewegung steht im append-only Ledger, wallets.gold ist der
+fortgeschriebene Saldo. Pro neuem Snapshot werden nur die Differenzen zum
+zuletzt gutgeschriebenen Stand gebucht (apply_earnings).
+"""
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from questdata import normalize_tag, quest_rows
+
+START_GOLD = 0  # Startguthaben für neue Spieler (Gold kommt aus XP und Quests)
+GOLD_XP_STEP = 10  # 1 Gold je volle 10 XP
+GOLD_PER_QUEST = 5  # Gold pro erledigter Quest
+BUSY_TIMEOUT = 10.0  # Sekunden, die auf eine gesperrte Datenbank gewartet wird
+SYNC_BATCH = 500  # Käufe pro Schreibaufruf
+SYNC_MAX_BACKOFF = 300.0  # längste Pause nach Fehlern beim Zurückschreiben
+
+# Kopfzeile des Käufe-Blatts; Spalte A ist der Idempotenz-Schlüssel
+PURCHASE_HEADER = ["Schlüssel", "Zeit", "Gamertag", "Item", "Preis", "Gold danach"]
+
+# Ergebnisse von ShopStore.buy
+BOUGHT = "bought"
+OWNED = "owned"
+NO_GOLD = "no_gold"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallets (
+    gamertag TEXT PRIMARY KEY,
+    gold INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    gamertag TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    bought_at REAL NOT NULL,
+    PRIMARY KEY (gamertag, item_id)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    gamertag TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    gold_after INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (sent_at, created_at);
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    gamertag TEXT NOT NULL,
+    source TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_gamertag ON ledger (gamertag, id);
+CREATE TABLE IF NOT EXISTS credited (
+    gamertag TEXT NOT NULL,
+    source TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (gamertag, source)
+);
+"""
+
+log = logging.getLogger(__name__)
+
+
+class Earnings:
+    """Verdientes Gold pro Spieler und Quelle aus einem Snapshot-Paar, einmal pro Snapshot berechnet.
+
+    amounts: {Gamertag: {"xp": .., "quests": .., "gold": ..}}
+    """
+
+    SOURCES = ("xp", "quests", "gold")
+
+    def __init__(self, players, names, quests):
+        q_pos, has_row = quest_rows(players, names, quests)
+        xp = players.xp.astype(np.int64)
+        done = np.zeros(len(players), dtype=np.int64)
+        done[has_row] = quests.done_count[q_pos[has_row]]
+        gold = np.zeros(len(players), dtype=np.int64)
+        gold[has_row] = quests.gold[q_pos[has_row]]
+
+        columns = zip((np.maximum(xp, 0) // GOLD_XP_STEP).tolist(), (done * GOLD_PER_QUEST).tolist(), gold.tolist())
+        self.amounts = {tag: dict(zip(self.SOURCES, amounts)) for tag, amounts in zip(players.keys, columns)}
+
+
+class ShopStore:
+    """Wallet + Inventar pro Gamertag; eine Verbindung pro Thread, geteilt über den ganzen Prozess."""
+
+    def __init__(self, path, start_gold=START_GOLD):
+        self.path = path
+        self.start_gold = start_gold
+        self._local = threading.local()
+        self._applied = None  # zuletzt gebuchte Earnings (pro Prozess)
+        self._apply_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: Transaktionen werden explizit mit BEGIN gesteuert
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _write(self):
+        """Schreibtransaktion; BEGIN IMMEDIATE holt die Schreibsperre vor dem ersten Lesen."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _ensure_wallet(self, conn, tag):
+        created = conn.execute(
+            "INSERT OR IGNORE INTO wallets (gamertag, gold) VALUES (?, ?)", (tag, self.start_gold)
+        ).rowcount
+        if created and self.start_gold:
+            conn.execute(
+                "INSERT INTO ledger (gamertag, source, amount, created_at) VALUES (?, 'start', ?, ?)",
+                (tag, self.start_gold, time.time())
+            )
+
+    def wallet(self, gamertag):
+        """-> (Gold, frozenset der Item-ids); legt neue Spieler mit dem Startguthaben an."""
+        tag = normalize_tag(gamertag)
+        conn = self._conn()
+        row = conn.execute("SELECT gold FROM wallets WHERE gamertag = ?", (tag,)).fetchone()
+        if row is None:
+            with self._write():
+                self._ensure_wallet(conn, tag)
+            row = conn.execute("SELECT gold FROM wallets WHERE gamertag = ?", (tag,)).fetchone()
+        items = conn.execute("SELECT item_id FROM inventory WHERE gamertag = ?", (tag,)).fetchall()
+        return row[0], frozenset(i for (i,) in items)
+
+    def buy(self, gamertag, item):
+        """Kauft item atomar -> BOUGHT, OWNED oder NO_GOLD.
+
+        BEGIN IMMEDIATE holt die Schreibsperre vor dem Lesen des Guthabens, damit
+        zwei gleichzeitige Käufe nicht beide dasselbe Gold ausgeben.
+        """
+        tag = normalize_tag(gamertag)
+        with self._write() as conn:
+            self._ensure_wallet(conn, tag)
+            owned = conn.execute(
+                "SELECT 1 FROM inventory WHERE gamertag = ? AND item_id = ?", (tag, item['id'])
+            ).fetchone()
+            if owned:
+                result = OWNED
+            else:
+                (gold,) = conn.execute("SELECT gold FROM wallets WHERE gamertag = ?", (tag,)).fetchone()
+                if gold < item['price']:
+                    result = NO_GOLD
+                else:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE wallets SET gold = gold - ? WHERE gamertag = ?", (item['price'], tag)
+                    )
+                    conn.execute(
+                        "INSERT INTO inventory (gamertag, item_id, price, bought_at) VALUES (?, ?, ?, ?)",
+                        (tag, item['id'], item['price'], now)
+                    )
+                    conn.execute(
+                        "INSERT INTO ledger (gamertag, source, amount, created_at) VALUES (?, ?, ?, ?)",
+                        (tag, f"kauf:{item['id']}", -item['price'], now)
+                    )
+                    conn.execute(
+                        "INSERT INTO outbox (key, gamertag, item_id, price, gold_after, created_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (uuid.uuid4().hex, tag, item['id'], item['price'], gold - item['price'], now)
+                    )
+                    result = BOUGHT
+        return result
+
+    def apply_earnings(self, earnings):
+        """Bucht verdientes Gold aus einem neuen Snapshot -> Anzahl der neuen Ledger-Einträge.
+
+        Verglichen wird mit dem zuletzt gutgeschriebenen Stand pro Spieler und
+        Quelle (Tabelle credited); nur Differenzen werden gebucht, auch negative
+        (z.B. korrigierte XP). Dieselben Earnings werden pro Prozess nur einmal
+        geprüft; mehrere Prozesse buchen dank der Transaktion nichts doppelt.
+        """
+        with self._apply_lock:
+            if earnings is self._applied:
+                return 0
+            now = time.time()
+            entries = 0
+            with self._write() as conn:
+                credited = {
+                    (tag, source): total
+                    for tag, source, total in conn.execute("SELECT gamertag, source, total FROM credited")
+                }
+                for tag, amounts in earnings.amounts.items():
+                    for source, total in amounts.items():
+                        delta = total - credited.get((tag, source), 0)
+                        if not delta:
+                            continue
+                        self._ensure_wallet(conn, tag)
+                        conn.execute("UPDATE wallets SET gold = gold + ? WHERE gamertag = ?", (delta, tag))
+                        conn.execute(
+                            "INSERT INTO ledger (gamertag, source, amount, created_at) VALUES (?, ?, ?, ?)",
+                            (tag, source, delta, now)
+                        )
+                        conn.execute(
+                            "INSERT OR REPLACE INTO credited (gamertag, source, total) VALUES (?, ?, ?)",
+                            (tag, source, total)
+                        )
+                        entries += 1
+            self._applied = earnings
+            return entries
+
+    def ledger(self, gamertag, limit=20):
+        """Letzte Buchungen eines Spielers, neueste zuerst: [(Zeitpunkt, Quelle, Betrag), ...]."""
+        return self._conn().execute(
+            "SELECT created_at, source, amount FROM ledger WHERE gamertag = ? ORDER BY id DESC LIMIT ?",
+            (normalize_tag(gamertag), limit)
+        ).fetchall()
+
+    def pending(self, limit=SYNC_BATCH):
+        """Noch nicht zurückgeschriebene Käufe, älteste zuerst, als Zeilen im Format PURCHASE_HEADER."""
+        rows = self._conn().execute(
+            "SELECT key, created_at, gamertag, item_id, price, gold_after FROM outbox"
+            " WHERE sent_at IS NULL ORDER BY created_at LIMIT ?", (limit,)
+        ).fetchall()
+        return [
+            [key, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)), tag, item_id, price, gold_after]
+            for key, created, tag, item_id, price, gold_after in rows
+        ]
+
+    def pending_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL").fetchone()[0]
+
+    def mark_sent(self, keys):
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany("UPDATE outbox SET sent_at = ? WHERE key = ?", [(now, k) for k in keys])
+
+
+class PurchaseSync:
+    """Hintergrund-Thread, der die Outbox gesammelt ins Spreadsheet schreibt (write-behind).
+
+    append(rows) schreibt alle Zeilen mit einem API-Aufruf, existing_keys() liefert
+    die Schlüssel, die schon im Blatt stehen. Nach einem Fehler ist unklar, ob die
+    Zeilen angekommen sind; vor dem nächsten Versuch werden deshalb die Schlüssel
+    im Blatt abgeglichen, damit kein Kauf doppelt erscheint.
+    """
+
+    def __init__(self, store, append, existing_keys, interval=10.0, batch_size=SYNC_BATCH):
+        self.store = store
+        self.append = append
+        self.existing_keys = existing_keys
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+        self._uncertain = True  # beim Start: Stand des Blatts unbekannt (z.B. Absturz nach dem Schreiben)
+        self.stats = {"sent": 0, "batches": 0, "failures": 0}
+        self.last_flush = None
+        self.last_error = None
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="purchase-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            try:
+                while self.flush() >= self.batch_size:
+                    pass
+                delay = self.interval
+            except Exception as e:
+                self.last_error = e
+                self.stats["failures"] += 1
+                delay = min(delay * 2, SYNC_MAX_BACKOFF)
+                log.warning("Käufe konnten nicht zurückgeschrieben werden: %s", e)
+
+    def flush(self):
+        """Schreibt einen Stapel offener Käufe -> Anzahl der Käufe im Stapel."""
+        rows = self.store.pending(self.batch_size)
+        batch = len(rows)
+        if not rows:
+            return 0
+        if self._uncertain:
+            done = set(self.existing_keys())
+            sent = [row[0] for row in rows if row[0] in done]
+            if sent:
+                self.store.mark_sent(sent)
+            rows = [row for row in rows if row[0] not in done]
+        if rows:
+            self._uncertain = True
+            self.append(rows)
+            self.store.mark_sent([row[0] for row in rows])
+            self.stats["sent"] += len(rows)
+            self.stats["batches"] += 1
+        self._uncertain = False
+        self.last_flush = time.time()
+        self.last_error = None
+        return batch